@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import dac
+
+RESOLVER_URL = 'http://resolver.kb.nl/resolve?urn='
+
+# Seconds between progress reports
+REPORT_INTERVAL = 10
+
+# Linker of the current worker process
+linker = None
+
+
+def get_url(line):
+    '''
+    Get the resolver link for an input line holding either a resolver link
+    or an article URN.
+    '''
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('http'):
+        return line
+    if not line.endswith(':ocr'):
+        line += ':ocr'
+    return RESOLVER_URL + line
+
+
+def read_urls(f):
+    '''
+    Read the resolver links from an input file, skipping duplicates.
+    '''
+    urls = []
+    seen = set()
+    for line in f:
+        url = get_url(line)
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def read_checkpoint(path, retry=False):
+    '''
+    Get the links of the articles already in the output file. A last line
+    left incomplete by an interrupted run is removed. If retry is True,
+    articles with an error result are linked again, and their new result
+    is appended after the old one.
+    '''
+    done = set()
+    if not os.path.isfile(path):
+        return done
+
+    with io.open(path, 'rb+') as f:
+        end = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            end += len(line)
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            if retry and record['result'].get('status') != 'ok':
+                continue
+            done.add(record['url'])
+        f.truncate(end)
+
+    return done
+
+
+def init_worker(options):
+    '''
+    Load the model once for each worker process.
+    '''
+    global linker
+    if options.pop('async'):
+        # Batch mode and retrieving the topics in advance are implied
+        del options['batch'], options['prefetch_topics']
+        linker = dac.AsyncEntityLinker(**options)
+    else:
+        linker = dac.EntityLinker(**options)
+
+
+def link(url):
+    '''
+    Link the entities of an article in a worker process.
+    '''
+    try:
+        result = linker.link(url)
+    except Exception as e:
+        result = {'status': 'error', 'message':
+                  'Error linking article: ' + str(e)}
+    return url, result
+
+
+def run(urls, output, processes=None, retry=False, options=None):
+    '''
+    Link the articles not yet found in the output file, distributed over a
+    pool of worker processes, appending the results to the output file.
+    Returns the number of articles linked and the number of errors.
+    '''
+    done = read_checkpoint(output, retry)
+    todo = [url for url in urls if url not in done]
+
+    sys.stderr.write('Articles: {}, already linked: {}, to link: {}\n'.format(
+        len(urls), len(urls) - len(todo), len(todo)))
+
+    options = dict(options or {})
+    options['error_handling'] = True
+
+    pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                initargs=(options,))
+
+    count = 0
+    errors = 0
+    start = time.time()
+    last_report = start
+
+    try:
+        with io.open(output, 'ab') as f:
+            for url, result in pool.imap_unordered(link, todo):
+                record = {'url': url, 'result': result}
+                f.write(json.dumps(record).encode('utf-8') + b'\n')
+                f.flush()
+
+                count += 1
+                if result.get('status') != 'ok':
+                    errors += 1
+
+                now = time.time()
+                if now - last_report >= REPORT_INTERVAL or count == len(todo):
+                    last_report = now
+                    report(count, len(todo), errors, now - start)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return count, errors
+
+
+def report(count, total, errors, elapsed):
+    '''
+    Write the progress and throughput to stderr.
+    '''
+    rate = count / elapsed if elapsed else 0.0
+    remaining = (total - count) / rate if rate else 0.0
+    sys.stderr.write('{}/{} articles, {} errors, {:.2f} articles/s, '
+                     '{:.0f}s remaining\n'.format(count, total, errors, rate,
+                                                  remaining))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('input', type=str,
+                        help='file with article URNs or resolver links, one '
+                        'per line, or - for stdin')
+    parser.add_argument('output', type=str,
+                        help='JSON lines file the results are appended to')
+    parser.add_argument('-p', '--processes', required=False, type=int,
+                        default=None, help='number of worker processes')
+    parser.add_argument('-r', '--retry', required=False, action='store_true',
+                        help='link articles with an error result again')
+    parser.add_argument('-m', '--model', required=False, type=str,
+                        default='nn', help='model used for link prediction')
+    parser.add_argument('-d', '--debug', required=False, action='store_true',
+                        help='include unlinked entities in response')
+    parser.add_argument('-f', '--features', required=False,
+                        action='store_true', help='return feature values')
+    parser.add_argument('-c', '--candidates', required=False,
+                        action='store_true', help='return candidate list')
+    parser.add_argument('-b', '--batch', required=False, action='store_true',
+                        help='score the candidates of all entities at once')
+    parser.add_argument('-a', '--async', required=False, action='store_true',
+                        help='send independent service requests '
+                        'concurrently, implies -b and -t')
+    parser.add_argument('-t', '--topics', required=False, action='store_true',
+                        help='retrieve article topics in advance')
+    parser.add_argument('-s', '--staged', required=False, action='store_true',
+                        help='skip expensive features for unlikely candidates')
+
+    args = parser.parse_args()
+
+    if vars(args)['input'] == '-':
+        urls = read_urls(sys.stdin)
+    else:
+        with io.open(vars(args)['input'], encoding='utf-8') as f:
+            urls = read_urls(f)
+
+    options = {
+        'model': vars(args)['model'],
+        'debug': vars(args)['debug'],
+        'features': vars(args)['features'],
+        'candidates': vars(args)['candidates'],
+        'batch': vars(args)['batch'],
+        'async': vars(args)['async'],
+        'prefetch_topics': vars(args)['topics'],
+        'staged': vars(args)['staged']
+    }
+
+    count, errors = run(urls, vars(args)['output'],
+                        processes=vars(args)['processes'],
+                        retry=vars(args)['retry'], options=options)
+
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pprint import pprint
+
+abs_path = os.path.dirname(os.path.realpath(__file__))
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(object):
+    '''
+    Persistent cache for JSON serializable values, stored in an SQLite
+    database that can be shared between processes. Entries expire after ttl
+    seconds and the oldest entries are removed once the cache holds more
+    than size entries.
+    '''
+
+    def __init__(self, path, ttl=None, size=None):
+        '''
+        Initialize the cache, creating the database if necessary. Relative
+        paths are taken relative to the dac directory.
+        '''
+        self.path = os.path.join(abs_path, path)
+        self.ttl = ttl
+        self.size = size
+
+        self.hits = 0
+        self.misses = 0
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        '''
+        Get the database connection for the current thread. Connections are
+        not shared between threads or processes.
+        '''
+        pid = os.getpid()
+        if getattr(self.local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=60,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'key TEXT UNIQUE NOT NULL, '
+                         'value TEXT NOT NULL, '
+                         'created REAL NOT NULL)')
+            self.local.conn = conn
+            self.local.pid = pid
+        return self.local.conn
+
+    def get(self, key):
+        '''
+        Get the value stored for a key, or None if not found or expired.
+        Expired entries are left for purge to remove. Database errors are
+        logged and treated as a miss.
+        '''
+        key = json.dumps(key)
+
+        try:
+            conn = self.get_connection()
+            row = conn.execute('SELECT value, created FROM cache WHERE '
+                               'key = ?', (key, )).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Error reading from cache %s: %s', self.path, e)
+            row = None
+
+        if row and self.ttl and row[1] < time.time() - self.ttl:
+            row = None
+
+        with self.lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        '''
+        Store the value for a key, removing the oldest entries if the cache
+        is full. Database errors are logged and the value is not stored.
+        '''
+        key = json.dumps(key)
+        value = json.dumps(value)
+
+        try:
+            conn = self.get_connection()
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, created) '
+                         'VALUES (?, ?, ?)', (key, value, time.time()))
+
+            # Ids increase with every insert, so removing all but the last
+            # size ids keeps at most size entries
+            if self.size:
+                conn.execute('DELETE FROM cache WHERE id <= '
+                             '(SELECT MAX(id) FROM cache) - ?', (self.size, ))
+        except sqlite3.Error as e:
+            logger.warning('Error writing to cache %s: %s', self.path, e)
+
+    def invalidate(self, key):
+        '''
+        Remove the entry for a key.
+        '''
+        conn = self.get_connection()
+        conn.execute('DELETE FROM cache WHERE key = ?', (json.dumps(key), ))
+
+    def purge(self):
+        '''
+        Remove all expired entries.
+        '''
+        if self.ttl:
+            conn = self.get_connection()
+            conn.execute('DELETE FROM cache WHERE created < ?',
+                         (time.time() - self.ttl, ))
+
+    def clear(self):
+        '''
+        Remove all entries, e.g. after the underlying data has changed.
+        '''
+        conn = self.get_connection()
+        conn.execute('DELETE FROM cache')
+
+    def stats(self):
+        '''
+        Get the number of entries, as well as the number of hits and misses
+        in the current process.
+        '''
+        conn = self.get_connection()
+        stats = {}
+        stats['path'] = self.path
+        stats['entries'] = conn.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        if self.ttl:
+            stats['expired'] = conn.execute(
+                'SELECT COUNT(*) FROM cache WHERE created < ?',
+                (time.time() - self.ttl, )).fetchone()[0]
+        stats['hits'] = self.hits
+        stats['misses'] = self.misses
+        lookups = self.hits + self.misses
+        stats['hit_rate'] = self.hits / float(lookups) if lookups else 0.0
+        return stats
+
+
+class LRUCache(object):
+    '''
+    In-memory cache holding at most size entries, removing the least
+    recently used entries first. If a weight function is given, size
+    bounds the total weight of the values instead, e.g. their size in
+    bytes.
+    '''
+
+    def __init__(self, size, weight=None):
+        '''
+        Initialize an empty cache.
+        '''
+        self.size = size
+        self.weight = weight or (lambda value: 1)
+        self.entries = OrderedDict()
+        self.total = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        '''
+        Get the value stored for a key, or the default if not found.
+        '''
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        '''
+        Store the value for a key, removing the least recently used entries
+        if the cache is full. Values heavier than the cache size are not
+        stored.
+        '''
+        weight = self.weight(value)
+        with self.lock:
+            self.remove(key)
+            if self.size and weight > self.size:
+                return
+            self.entries[key] = value
+            self.total += weight
+            while self.size and self.total > self.size:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        '''
+        Remove the entry for a key, without locking.
+        '''
+        if key in self.entries:
+            self.total -= self.weight(self.entries.pop(key))
+
+    def invalidate(self, key):
+        '''
+        Remove the entry for a key.
+        '''
+        with self.lock:
+            self.remove(key)
+
+    def clear(self):
+        '''
+        Remove all entries.
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+    def stats(self):
+        '''
+        Get the number of entries, hits and misses.
+        '''
+        stats = {}
+        stats['entries'] = len(self.entries)
+        stats['total'] = self.total
+        stats['hits'] = self.hits
+        stats['misses'] = self.misses
+        lookups = self.hits + self.misses
+        stats['hit_rate'] = self.hits / float(lookups) if lookups else 0.0
+        return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path', type=str, help='cache database')
+    parser.add_argument('--ttl', required=False, type=int, default=None,
+                        help='time in seconds after which entries expire')
+    parser.add_argument('--stats', required=False, action='store_true',
+                        help='show the number of (expired) entries')
+    parser.add_argument('--purge', required=False, action='store_true',
+                        help='remove all expired entries')
+    parser.add_argument('--clear', required=False, action='store_true',
+                        help='remove all entries')
+
+    args = parser.parse_args()
+
+    cache = Cache(vars(args)['path'], ttl=vars(args)['ttl'])
+
+    if vars(args)['clear']:
+        cache.clear()
+    elif vars(args)['purge']:
+        cache.purge()
+
+    if vars(args)['stats']:
+        stats = cache.stats()
+        del stats['hits'], stats['misses'], stats['hit_rate']
+        pprint(stats)
@@ -2,19 +2,166 @@
 
 import json
 import os
+import tempfile
+import threading
+import time
+
 import requests
 
+abs_path = os.path.dirname(os.path.realpath(__file__))
+
 # CONFIG_URL = 'http://145.100.58.195:82/config.json'
 # CONFIG_URL = 'http://kbresearch.nl/dac/dac/config.json'
-CONFIG_URL = None
+CONFIG_URL = os.environ.get('DAC_CONFIG_URL')
+
+# Local copy of the last remote configuration retrieved, in the dac
+# directory unless an absolute path is given
+CONFIG_CACHE = os.path.join(abs_path, os.environ.get('DAC_CONFIG_CACHE',
+                                                     'config.cache.json'))
 
+# Timeout for retrieving the remote configuration, and seconds between
+# refreshes
+CONFIG_TIMEOUT = 10
+CONFIG_INTERVAL = 300
 
-def parse_config(config_url=CONFIG_URL):
+
+def parse_config(config_url=CONFIG_URL, timeout=CONFIG_TIMEOUT):
     if config_url:
-        response = requests.get(config_url)
+        response = requests.get(config_url, timeout=timeout)
         if response.status_code == 200:
             return json.loads(response.content)
         return False
     else:
-        abs_path = os.path.dirname(os.path.realpath(__file__))
         return json.load(open(os.path.join(abs_path, 'config.json')))
+
+
+class Config(object):
+    '''
+    Configuration read from the local config.json file, or from a remote
+    location if specified. Settings missing from the remote configuration
+    keep their local values. A remote configuration is never waited for:
+    the last one retrieved is cached on disk and used at startup, while a
+    background thread refreshes it periodically. Functions registered with
+    add_listener are called when the configuration changes.
+    '''
+
+    def __init__(self, url=CONFIG_URL, cache_path=CONFIG_CACHE,
+                 timeout=CONFIG_TIMEOUT, interval=CONFIG_INTERVAL):
+        '''
+        Load the cached or local configuration and start refreshing the
+        remote configuration, if any.
+        '''
+        self.url = url
+        self.cache_path = os.path.join(abs_path, cache_path)
+        self.timeout = timeout
+        self.interval = interval
+
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+
+        with open(os.path.join(abs_path, 'config.json')) as f:
+            self.defaults = json.load(f)
+        self.data = self.load()
+        if self.url:
+            self.start()
+
+    def load(self):
+        '''
+        Load the cached remote configuration if available, merged with the
+        local configuration.
+        '''
+        if self.url and os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    return self.merge(json.load(f))
+            except (IOError, ValueError):
+                pass
+
+        return dict(self.defaults)
+
+    def merge(self, data):
+        '''
+        Merge a remote configuration with the local configuration.
+        '''
+        merged = dict(self.defaults)
+        merged.update(data)
+        return merged
+
+    def get(self, key, default=None):
+        '''
+        Get a configuration value. In a forked process, refreshing the
+        remote configuration is started again first.
+        '''
+        if self.url and self.pid != os.getpid():
+            self.start()
+        return self.data.get(key, default)
+
+    def add_listener(self, listener):
+        '''
+        Register a function to be called with the configuration whenever it
+        changes.
+        '''
+        self.listeners.append(listener)
+
+    def start(self):
+        '''
+        Start the background thread refreshing the remote configuration for
+        the current process.
+        '''
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        '''
+        Refresh the remote configuration until the process ends.
+        '''
+        while True:
+            self.refresh()
+            if not self.interval:
+                break
+            time.sleep(self.interval)
+
+    def refresh(self):
+        '''
+        Retrieve the remote configuration and cache it if valid. Returns
+        True if the configuration was retrieved.
+        '''
+        try:
+            remote = parse_config(self.url, self.timeout)
+        except (requests.RequestException, ValueError):
+            return False
+
+        if not isinstance(remote, dict):
+            return False
+
+        data = self.merge(remote)
+        changed = data != self.data
+        self.data = data
+
+        if changed:
+            self.save(remote)
+            for listener in self.listeners:
+                listener(self)
+
+        return True
+
+    def save(self, remote):
+        '''
+        Cache the remote configuration on disk, replacing the previous copy
+        at once so other processes never read a partial file.
+        '''
+        try:
+            fd, path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(remote, f, indent=4, sort_keys=True)
+            os.rename(path, self.cache_path)
+        except (IOError, OSError):
+            pass
@@ -21,9 +21,10 @@
 
 # Standard library imports
 import argparse
-import json
+import copy
 import math
-import re
+import os
+import threading
 from operator import attrgetter
 from operator import itemgetter
 from pprint import pprint
@@ -31,29 +32,245 @@ from pprint import pprint
 # Third-party imports
 import Levenshtein
 import numpy as np
-import requests
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from lxml import etree
-from sklearn.metrics.pairwise import cosine_similarity
 
 # DAC imports
+import cache
 import config
 import dictionary
 import models
+import names
+import services
 import utilities
+import vectors
+
+# Configuration, refreshed in the background if retrieved from a remote
+# location
+conf = config.Config()
+
+# Connection pools for all services
+client = services.ServiceClient(conf)
+
+# Persistent cache for Solr results, if configured
+solr_cache = None
+if conf.get('SOLR_CACHE'):
+    solr_cache = cache.Cache(conf.get('SOLR_CACHE'),
+                             ttl=conf.get('SOLR_CACHE_TTL'),
+                             size=conf.get('SOLR_CACHE_SIZE'))
+
+# Word vectors, from a local vector store if available, otherwise from the
+# word2vec service, cached per word in memory and optionally on disk
+if conf.get('W2V_PATH'):
+    w2v = vectors.LocalVectors(conf.get('W2V_PATH'))
+else:
+    w2v_cache = None
+    if conf.get('W2V_CACHE'):
+        w2v_cache = cache.Cache(conf.get('W2V_CACHE'))
+    w2v = vectors.RemoteVectors(conf.get('W2V_URL'), client,
+                                size=conf.get('W2V_CACHE_SIZE', 100000),
+                                disk_cache=w2v_cache,
+                                get_executor=lambda: get_executor(
+                                    'w2v', W2V_THREADS))
+
+# Decoded candidate vectors, by Solr document id, holding at most
+# DOC_VECTORS_CACHE_BYTES bytes of vectors in each process
+doc_vectors = vectors.DocumentVectors(conf.get('DOC_VECTORS_CACHE_BYTES',
+                                               64 * 1024 * 1024))
+
+
+def set_service_options(conf):
+    '''
+    Set the service locations and options, again whenever the configuration
+    changes.
+    '''
+    global TPTA_URL, JSRU_URL, SOLR_URL, W2V_URL, TOPICS_URL, SOLR_MODE
+
+    # Service locations
+    TPTA_URL = conf.get('TPTA_URL')
+    JSRU_URL = conf.get('JSRU_URL')
+    SOLR_URL = conf.get('SOLR_URL')
+    W2V_URL = conf.get('W2V_URL')
+    TOPICS_URL = conf.get('TOPICS_URL')
+
+    # Service options
+    SOLR_MODE = conf.get('SOLR_MODE', 'sequential')
+
+    if isinstance(w2v, vectors.RemoteVectors):
+        w2v.url = W2V_URL
+
 
-# Service locations
-conf = config.parse_config()
-TPTA_URL = conf.get('TPTA_URL')
-JSRU_URL = conf.get('JSRU_URL')
-SOLR_URL = conf.get('SOLR_URL')
-W2V_URL = conf.get('W2V_URL')
-TOPICS_URL = conf.get('TOPICS_URL')
+conf.add_listener(set_service_options)
+set_service_options(conf)
 
 # Constant values
 WINDOW = 20
 SOLR_ROWS = 25
 MIN_PROB = 0.5
 
+# Margin for numerical differences between probability bounds and
+# predicted probabilities
+BOUND_MARGIN = 1e-6
+
+# Thread pool sizes
+ARTICLE_THREADS = 8
+CONTEXT_THREADS = 24
+CLUSTER_THREADS = 16
+SOLR_THREADS = 16
+W2V_THREADS = 8
+
+# Thread pools for concurrent requests, by name and process id
+executors = {}
+executors_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    '''
+    Get the thread pool with the given name for the current process.
+    '''
+    key = (name, os.getpid())
+    with executors_lock:
+        if key not in executors:
+            executors[key] = ThreadPoolExecutor(max_workers=max_workers)
+        return executors[key]
+
+
+class FeaturePlan(object):
+    '''
+    The feature extraction steps needed for a set of model features. Steps
+    setting only features the model doesn't use are left out.
+    '''
+    # Steps run for each candidate, in order, with the features they set;
+    # names ending with '*' are prefixes
+    DESCRIPTION_STEPS = [
+        ('set_entity_quotes', ['entity_quotes']),
+        ('set_entity_confidence', ['entity_ner_confidence']),
+        ('set_entity_article_type', ['entity_article_type*']),
+        ('set_candidate_lang', ['candidate_lang']),
+        ('set_candidate_ambig', ['candidate_ambig']),
+        ('set_candidate_inlinks', ['candidate_inlinks*']),
+        ('set_solr_properties', ['match_str_solr*']),
+        ('set_levenshtein', ['match_str_lsr*']),
+        ('set_abbr_match', ['match_str_abbr*', 'entity_abbr*']),
+        ('set_txt_labels_match', ['match_txt_labels']),
+        ('set_spec_match', ['match_txt_spec']),
+        ('set_keyword_match', ['match_txt_keyword']),
+        ('set_title_match', ['match_txt_title']),
+        ('set_role_match', ['match_txt_role']),
+        ('set_type_match', ['candidate_type*', 'match_txt_type*']),
+        ('set_topic_match', ['candidate_topic*', 'match_txt_topic*']),
+        ('set_entity_match', ['match_txt_entities'])
+    ]
+
+    # Steps run for all candidates of a candidate list at once
+    GROUP_STEPS = [
+        ('set_entity_type', ['entity_type*']),
+        ('set_entity_topic', ['entity_topic*']),
+        ('set_topic_match', ['match_txt_topic*']),
+        ('set_vector_match', ['entity_vec*', 'match_txt_vec*']),
+        ('set_entity_vector_match', ['candidate_vec*',
+                                     'match_txt_entity_vec*'])
+    ]
+
+    # Steps depending on the topics and word2vec services, which are
+    # deferred in staged mode
+    DEFERRED_STEPS = ['set_topic_match', 'set_entity_topic',
+                      'set_vector_match', 'set_entity_vector_match']
+
+    # Value ranges of the features set by deferred steps, None if unbounded
+    DEFERRED_RANGES = [
+        ('entity_topic*', (0.0, 1.0)),
+        ('candidate_topic*', (0.0, 1.0)),
+        ('match_txt_topic', (-0.25, 0.75)),
+        ('entity_vec*', None),
+        ('match_txt_vec_max', (-1.375, 0.625)),
+        ('match_txt_vec_mean', (-1.0625, 0.9375)),
+        ('candidate_vec*', None),
+        ('match_txt_entity_vec_max', (-1.375, 0.625)),
+        ('match_txt_entity_vec_mean', (-1.125, 0.875))
+    ]
+
+    def __init__(self, features):
+        '''
+        Select the steps needed for the given features.
+        '''
+        self.features = features
+        self.matches = {}
+
+        self.steps = [step for step, patterns in self.DESCRIPTION_STEPS
+                      if self.has(*patterns)]
+        self.group_steps = [step for step, patterns in self.GROUP_STEPS
+                            if self.has(*patterns)]
+
+        # Steps and feature ranges for staged mode
+        self.early_steps = [s for s in self.steps if s not in
+                            self.DEFERRED_STEPS]
+        self.early_group_steps = [s for s in self.group_steps if s not in
+                                  self.DEFERRED_STEPS]
+        self.deferred_steps = [s for s in self.steps if s in
+                               self.DEFERRED_STEPS]
+        self.deferred_group_steps = [s for s in self.group_steps if s in
+                                     self.DEFERRED_STEPS]
+        self.set_deferred_ranges()
+
+    def set_deferred_ranges(self):
+        '''
+        Set the columns and value ranges of the features set by deferred
+        steps. If any of these features is unbounded, bounded is False.
+        '''
+        self.deferred_columns = []
+        lows = []
+        highs = []
+        self.bounded = True
+
+        for i, f in enumerate(self.features):
+            for pattern, value_range in self.DEFERRED_RANGES:
+                if (f == pattern or pattern.endswith('*') and
+                        f.startswith(pattern[:-1])):
+                    if value_range is None:
+                        self.bounded = False
+                    else:
+                        self.deferred_columns.append(i)
+                        lows.append(value_range[0])
+                        highs.append(value_range[1])
+                    break
+
+        self.deferred_lows = np.array(lows)
+        self.deferred_highs = np.array(highs)
+
+    def has(self, *patterns):
+        '''
+        Determine if any of the features matches any of the patterns.
+        '''
+        for pattern in patterns:
+            if pattern not in self.matches:
+                if pattern.endswith('*'):
+                    self.matches[pattern] = any(
+                        f.startswith(pattern[:-1]) for f in self.features)
+                else:
+                    self.matches[pattern] = pattern in self.features
+            if self.matches[pattern]:
+                return True
+        return False
+
+
+# Feature plans, by feature set
+feature_plans = {}
+feature_plans_lock = threading.Lock()
+
+
+def get_feature_plan(features):
+    '''
+    Get the feature plan for the given features.
+    '''
+    key = tuple(features)
+    with feature_plans_lock:
+        if key not in feature_plans:
+            feature_plans[key] = FeaturePlan(features)
+        return feature_plans[key]
+
 
 class EntityLinker(object):
     '''
@@ -61,7 +278,8 @@ class EntityLinker(object):
     '''
 
     def __init__(self, model=None, debug=False, features=False,
-                 candidates=False, error_handling=True):
+                 candidates=False, error_handling=True, batch=False,
+                 prefetch_topics=False, staged=False):
         '''
         Initialize the disambiguation model and Solr connection.
         '''
@@ -83,10 +301,15 @@ class EntityLinker(object):
         else:
             self.model = model
 
+        self.plan = get_feature_plan(self.model.features)
+
         self.debug = debug
         self.features = features
         self.candidates = candidates
         self.error_handling = error_handling
+        self.batch = batch
+        self.prefetch_topics = prefetch_topics
+        self.staged = staged
 
     def link(self, url, ne=None):
         '''
@@ -96,7 +319,7 @@ class EntityLinker(object):
         ne = ne.decode('utf-8') if ne else None
 
         try:
-            self.context = Context(url, ne)
+            self.context = self.get_context(url, ne)
         except Exception as e:
             if self.error_handling:
                 return {'status': 'error', 'message':
@@ -126,9 +349,16 @@ class EntityLinker(object):
         clusters_linked = []
 
         while clusters_to_link:
-            cluster = clusters_to_link.pop()
+            # In batch mode, link all clusters in the queue at once, otherwise
+            # one cluster at a time
+            if self.batch:
+                clusters = clusters_to_link[::-1]
+                del clusters_to_link[:]
+            else:
+                clusters = [clusters_to_link.pop()]
+
             try:
-                result = cluster.link(self.model)
+                self.link_clusters(clusters)
             except Exception as e:
                 if self.error_handling:
                     return {'status': 'error', 'message':
@@ -136,32 +366,34 @@ class EntityLinker(object):
                 else:
                     raise
 
-            # If a cluster consists of multiple, significantly differing
-            # entities and could not be linked, split it up and return the
-            # new clusters to the queue.
-            cluster.entities[0].reset_norm()
-
-            sub_entities = [e for e in cluster.entities if
-                            Levenshtein.distance(e.norm,
-                                                 cluster.entities[0].norm) > 1]
-
-            if sub_entities:
-                if not result.link:
-                    new_clusters = [Cluster([e for e in cluster.entities if e
-                                             not in sub_entities])]
-                    new_clusters.extend(self.get_clusters(sub_entities))
-
-                    # If linking a specific ne, only return the new cluster
-                    # containing that ne to the queue
-                    if ne:
-                        clusters_to_link.extend([c for c in new_clusters if
-                                                 entity_to_link in c.entities])
+            for cluster in clusters:
+                # If a cluster consists of multiple, significantly differing
+                # entities and could not be linked, split it up and return the
+                # new clusters to the queue.
+                cluster.entities[0].reset_norm()
+
+                sub_entities = [e for e in cluster.entities if
+                                Levenshtein.distance(
+                                    e.norm, cluster.entities[0].norm) > 1]
+
+                if sub_entities:
+                    if not cluster.result.link:
+                        new_clusters = [Cluster([e for e in cluster.entities
+                                                 if e not in sub_entities])]
+                        new_clusters.extend(self.get_clusters(sub_entities))
+
+                        # If linking a specific ne, only return the new
+                        # cluster containing that ne to the queue
+                        if ne:
+                            clusters_to_link.extend([c for c in new_clusters
+                                                     if entity_to_link in
+                                                     c.entities])
+                        else:
+                            clusters_to_link.extend(new_clusters)
                     else:
-                        clusters_to_link.extend(new_clusters)
+                        clusters_linked.append(cluster)
                 else:
                     clusters_linked.append(cluster)
-            else:
-                clusters_linked.append(cluster)
 
         # Return the result for each (unique) entity
         results = []
@@ -178,6 +410,95 @@ class EntityLinker(object):
 
         return {'status': 'ok', 'linkedNEs': results}
 
+    def get_context(self, url, ne=None):
+        '''
+        Get the context information for the article.
+        '''
+        return Context(url, ne, self.prefetch_topics)
+
+    def link_many(self, urls, workers=ARTICLE_THREADS):
+        '''
+        Link the named entity mentions in a number of articles, linking at
+        most workers articles at the same time. Yields (url, result) tuples
+        as the articles are completed.
+        '''
+        urls = iter(urls)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = {}
+
+        try:
+            while True:
+                # Keep up to workers articles in progress
+                for url in urls:
+                    # Each article gets its own copy of the linker, sharing
+                    # the model
+                    linker = copy.copy(self)
+                    pending[executor.submit(linker.link, url)] = url
+                    if len(pending) >= workers:
+                        break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if self.error_handling:
+                            result = {'status': 'error', 'message':
+                                      'Error linking article: ' + str(e)}
+                        else:
+                            raise
+                    yield url, result
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def link_clusters(self, clusters):
+        '''
+        Get the link results for a list of clusters. Candidates are retrieved
+        and filtered for all clusters first, then the remaining candidates of
+        all clusters are scored with a single model call. In staged mode,
+        clusters are ranked one by one instead.
+        '''
+        to_rank = [c for c in clusters if c.prepare(self.model)]
+
+        if self.staged and self.model.__class__.__name__ != 'BaseModel':
+            for cluster in to_rank:
+                cluster.cand_list.rank_staged()
+                cluster.resolve()
+            return
+
+        examples = [c.cand_list.get_examples() for c in to_rank]
+
+        self.rank_clusters(to_rank, examples)
+
+    def rank_clusters(self, clusters, examples):
+        '''
+        Score the candidates of the given clusters, using the feature matrix
+        of each cluster, and select the best candidate for each.
+        '''
+        if not clusters:
+            return
+
+        # Only calculate probs if not in training mode
+        if self.model.__class__.__name__ != 'BaseModel':
+            probs = self.model.predict_batch(np.vstack(examples))
+            start = 0
+            for cluster, cluster_examples in zip(clusters, examples):
+                end = start + len(cluster_examples)
+                cluster.cand_list.set_probs(probs[start:end])
+                start = end
+        else:
+            for cluster in clusters:
+                cluster.cand_list.set_probs()
+
+        for cluster in clusters:
+            cluster.resolve()
+
     def get_clusters(self, entities):
         '''
         Group related entities into clusters.
@@ -277,22 +598,96 @@ class EntityLinker(object):
         return new_clusters
 
 
+class AsyncEntityLinker(EntityLinker):
+    '''
+    Entity linker sending independent service requests concurrently.
+    Article metadata, entities and topics are retrieved at the same time,
+    and candidates are retrieved and featurized for all clusters at once.
+    '''
+
+    def __init__(self, model=None, debug=False, features=False,
+                 candidates=False, error_handling=True, prefetch_topics=True,
+                 staged=False):
+        '''
+        Initialize the disambiguation model, always linking in batch mode.
+        '''
+        super(AsyncEntityLinker, self).__init__(
+            model=model, debug=debug, features=features,
+            candidates=candidates, error_handling=error_handling, batch=True,
+            prefetch_topics=prefetch_topics, staged=staged)
+
+    def submit(self, url, ne=None):
+        '''
+        Start linking the entities in an article and return a future for
+        the result.
+        '''
+        # Each article gets its own copy of the linker, sharing the model
+        linker = copy.copy(self)
+        executor = get_executor('articles', ARTICLE_THREADS)
+        return executor.submit(linker.link, url, ne)
+
+    def link_clusters(self, clusters):
+        '''
+        Get the link results for a list of clusters, retrieving and
+        featurizing the candidates of all clusters concurrently. In staged
+        mode, only the candidates are retrieved concurrently, and clusters
+        are ranked one by one.
+        '''
+        staged = (self.staged and
+                  self.model.__class__.__name__ != 'BaseModel')
+
+        executor = get_executor('clusters', CLUSTER_THREADS)
+        futures = [executor.submit(self.prepare_cluster, c, staged) for c in
+                   clusters]
+        results = [f.result() for f in futures]
+
+        to_rank = [c for c, r in zip(clusters, results) if r is not None]
+        examples = [r for r in results if r is not None]
+
+        if staged:
+            for cluster in to_rank:
+                cluster.cand_list.rank_staged()
+                cluster.resolve()
+            return
+
+        self.rank_clusters(to_rank, examples)
+
+    def prepare_cluster(self, cluster, staged=False):
+        '''
+        Get the feature matrix of the cluster candidates, if any. In staged
+        mode, the features are calculated while ranking instead.
+        '''
+        if cluster.prepare(self.model):
+            if staged:
+                return []
+            return cluster.cand_list.get_examples()
+
+
 class Context(object):
     '''
     The context information for an entity.
     '''
 
-    def __init__(self, url, ne=None):
+    def __init__(self, url, ne=None, prefetch_topics=False):
         '''
         Retrieve ocr, metadata, topics and entities.
         '''
         self.url = url
         self.ne = ne
+        self.topics_future = None
+
+        executor = get_executor('context', CONTEXT_THREADS)
 
-        # Article enitities, ocr and metadata are retrieved immediately;
-        # other context information (topics) are added later if needed.
-        self.get_metadata()
-        self.get_entities()
+        # Topics are added later if needed, unless prefetching is turned on,
+        # in which case they are retrieved alongside the other information
+        if prefetch_topics:
+            self.topics_future = executor.submit(self.retrieve_topics)
+
+        # Article enitities, ocr and metadata are retrieved immediately
+        futures = [executor.submit(self.get_metadata),
+                   executor.submit(self.get_entities)]
+        for f in futures:
+            f.result()
 
     def get_metadata(self):
         '''
@@ -303,7 +698,7 @@ class Context(object):
         payload['x-collection'] = 'DDD_artikel'
         payload['query'] = 'uniqueKey=' + self.url.split('urn=')[-1][:-4]
 
-        response = requests.get(JSRU_URL, params=payload, timeout=30)
+        response = client.get('JSRU', JSRU_URL, params=payload)
         if response.status_code != 200:
             raise IOError('Error retrieving metadata from: {}'.format(
                 JSRU_URL))
@@ -329,7 +724,7 @@ class Context(object):
         payload['ne'] = self.ne
         payload['context'] = WINDOW
 
-        response = requests.get(TPTA_URL, params=payload, timeout=300)
+        response = client.get('TPTA', TPTA_URL, params=payload)
         if response.status_code != 200:
             raise IOError('Error retrieving entities from: {}'.format(
                 TPTA_URL))
@@ -351,8 +746,9 @@ class Context(object):
 
         self.ocr = ocr
 
-        # Normalize and tokenize
-        bow = utilities.tokenize(ocr, unique=False)
+        # Normalize and tokenize, keeping token offsets for entity windows
+        self.token_index = utilities.TokenIndex(ocr)
+        bow = self.token_index.tokens
 
         self.ocr_norm = ' '.join(bow)
         self.ocr_bow = list(set([t for t in bow if len(t) > 5]))
@@ -394,17 +790,27 @@ class Context(object):
         self.entities = entities
 
     def get_topics(self):
+        '''
+        Get topic probabilities, waiting for the prefetched topics if
+        available.
+        '''
+        if self.topics_future is not None:
+            self.topics = self.topics_future.result()
+        else:
+            self.topics = self.retrieve_topics()
+
+    def retrieve_topics(self):
         '''
         Retrieve topic probabilities from topics service.
         '''
         payload = {'url': self.url}
-        response = requests.get(TOPICS_URL, params=payload, timeout=300)
+        response = client.get('TOPICS', TOPICS_URL, params=payload)
 
         if response.status_code != 200:
             raise IOError('Error retrieving topics from: {}'.format(
                 TOPICS_URL))
 
-        self.topics = response.json()['topics']
+        return response.json()['topics']
 
 
 class Entity(object):
@@ -429,16 +835,22 @@ class Entity(object):
         self.right_context = right_context
         self.context = context
 
-        # Tokenize context
-        self.window_left = utilities.tokenize(left_context, segment=False)
-        self.window_right = utilities.tokenize(right_context, segment=False)
+        # Tokenize context, using the tokens of the article if available
+        token_index = getattr(context, 'token_index', None)
+        if token_index:
+            self.window_left = token_index.window(left_context)
+            self.window_right = token_index.window(right_context)
+        else:
+            self.window_left = utilities.tokenize(left_context, segment=False)
+            self.window_right = utilities.tokenize(right_context,
+                                                   segment=False)
 
         # Clean, analyze entity string
         self.norm = utilities.normalize(self.text)
         self.title, self.title_form = self.get_title()
         self.role, self.role_form = self.get_role()
         self.stripped = self.strip_titles()
-        self.last_part = utilities.get_last_part(self.stripped)
+        self.last_part = names.get_last_part(self.stripped)
 
         # Check result validity
         if self.is_valid():
@@ -456,7 +868,7 @@ class Entity(object):
         if self.window_left:
             words.append(self.window_left[-1])
         for word in words:
-            if word in dictionary.titles:
+            if word in dictionary.titles_set:
                 return True, word
         return None, None
 
@@ -473,11 +885,9 @@ class Entity(object):
             words.append(self.window_right[0])
 
         for word in words:
-            for role in dictionary.roles_vocab:
-                for r in dictionary.roles_vocab[role]:
-                    if (word == r or word == r + 's' or word == r + 'en' or
-                            len(r) >= 5 and word.endswith(r)):
-                        return role, word
+            role = dictionary.find_role(word)
+            if role:
+                return role, word
 
         return None, None
 
@@ -508,7 +918,7 @@ class Entity(object):
         '''
         Check if the entity is some sort of date.
         '''
-        if [w for w in self.norm.split() if w in dictionary.months]:
+        if [w for w in self.norm.split() if w in dictionary.months_set]:
             if [w for w in self.norm.split() if w.isdigit()]:
                 return True
         return False
@@ -541,10 +951,9 @@ class Entity(object):
             if self.window_left[-1] in ['in', 'te', 'uit']:
                 return 'location'
 
-            for t in dictionary.types_vocab:
-                for v in dictionary.types_vocab[t]:
-                    if v in self.window_left[-1]:
-                        return t
+            alt_type = dictionary.find_type(self.window_left[-1])
+            if alt_type:
+                return alt_type
 
         return None
 
@@ -552,44 +961,13 @@ class Entity(object):
         '''
         Try to substitute norm with basic spelling variant.
         '''
-        subs = []
-
-        # Replace oo with o
-        if self.stripped.find('oo') > -1:
-            subs.append(self.stripped.replace('oo', 'o'))
-
-        # Replace y with ij
-        if self.stripped.find('y') > -1:
-            subs.append(self.stripped.replace('y', 'ij'))
-
-        # Replace ae with aa
-        if self.stripped.find('ae') > -1:
-            subs.append(self.stripped.replace('ae', 'aa'))
-
-        # Remove trailing s
-        if self.stripped.endswith('s'):
-            subs.append(self.stripped[:-1])
-
-        # Replace sch(e) with s(e)
-        pattern = r'(^|\s)([a-zA-Z]{2,})sch(e?)'
-        if re.search(pattern, self.stripped):
-            subs.append(re.sub(pattern, r'\1\2s\3', self.stripped))
-
-        # Replace trailing v with w
-        pattern = r'(^|\s)([a-zA-Z]{2,})v($|\s)'
-        if re.search(pattern, self.stripped):
-            subs.append(re.sub(pattern, r'\1\2w\3', self.stripped))
-
-        # Replace trailing w with v
-        pattern = r'(^|\s)([a-zA-Z]{2,})w($|\s)'
-        if re.search(pattern, self.stripped):
-            subs.append(re.sub(pattern, r'\1\2v\3', self.stripped))
+        subs = names.get_substitutions(self.stripped)
 
         # If there is exactly one possible substitution, replace norm,
         # stripped and last_part
         if len(subs) == 1:
             return (self.norm.replace(self.stripped, subs[0]), subs[0],
-                    utilities.get_last_part(subs[0]))
+                    names.get_last_part(subs[0]))
 
         return None, None, None
 
@@ -605,8 +983,8 @@ class Entity(object):
         payload['suggest.q'] = self.stripped
         payload['wt'] = 'json'
 
-        response = requests.get(SOLR_URL + 'suggest/?', params=payload,
-                                timeout=300)
+        response = client.get('SOLR', SOLR_URL + 'suggest/?',
+                              params=payload)
 
         if response.status_code != 200:
             raise IOError('Error retrieving Solr suggestions from: {}'.format(
@@ -620,7 +998,7 @@ class Entity(object):
 
             if sugg_term != self.stripped:
                 return (self.norm.replace(self.stripped, sugg_term),
-                        sugg_term, utilities.get_last_part(sugg_term))
+                        sugg_term, names.get_last_part(sugg_term))
 
         return None, None, None
 
@@ -667,36 +1045,52 @@ class Cluster(object):
         '''
         Get the link result for the cluster.
         '''
+        if self.prepare(model):
+            self.cand_list.rank()
+            self.resolve()
+        return self.result
+
+    def prepare(self, model):
+        '''
+        Retrieve and filter the candidate descriptions for the cluster.
+        Return True if any candidates remain to be ranked, otherwise set
+        the result and return False.
+        '''
         # Check validity of the main entity
         if not self.entities[0].valid:
             self.result = Result('Invalid entity')
-            return self.result
+            return False
 
         # If entity is valid, try to query Solr for candidate descriptions
-        cand_list = CandidateList(self, model)
+        self.cand_list = CandidateList(self, model)
 
         # Check the number of descriptions found
-        if not cand_list.candidates:
+        if not self.cand_list.candidates:
             self.result = Result('Nothing found')
-            return self.result
+            return False
 
         # Filter descriptions according to hard criteria, e.g. name conlfict
-        cand_list.filter()
-        if not cand_list.filtered_candidates:
-            self.result = Result('Name or date conflict', cand_list=cand_list)
-            return self.result
-
-        # If any candidates remain, calculate probabilities and select the best
-        cand_list.rank()
-        best_match = cand_list.ranked_candidates[0]
+        self.cand_list.filter()
+        if not self.cand_list.filtered_candidates:
+            self.result = Result('Name or date conflict',
+                                 cand_list=self.cand_list)
+            return False
+
+        return True
+
+    def resolve(self):
+        '''
+        Select the best of the ranked candidates and set the result.
+        '''
+        best_match = self.cand_list.ranked_candidates[0]
         if best_match.prob >= MIN_PROB:
             self.result = Result('Predicted link', best_match.prob, best_match,
-                                 cand_list=cand_list)
+                                 cand_list=self.cand_list)
         else:
             self.result = Result('Probability too low for: ' +
                                  best_match.document.get('label'),
                                  best_match.prob, best_match,
-                                 cand_list=cand_list)
+                                 cand_list=self.cand_list)
         return self.result
 
     def get_type_ratios(self):
@@ -736,7 +1130,7 @@ class Cluster(object):
                 window.append(e.role_form)
 
         window = [w for w in window if len(w) >= 5 and w not in entity_parts
-                  and w not in dictionary.unwanted]
+                  and w not in dictionary.unwanted_set]
 
         self.window = list(set(window))
 
@@ -748,9 +1142,16 @@ class Cluster(object):
         if not hasattr(self, 'entity_parts'):
             self.get_entity_parts()
 
-        context_entity_parts = [p for e in self.context.entities for p in
-                                e.norm.split() if p not in self.entity_parts
-                                and p not in dictionary.unwanted and
+        # Entities of other clusters may temporarily have a substituted norm
+        # if they are being linked at the same time, so use the original one
+        norms = [e.norm if e in self.entities else
+                 getattr(e, 'norm_orig', e.norm) for e in
+                 self.context.entities]
+
+        context_entity_parts = [p for e, norm in zip(self.context.entities,
+                                                     norms) for p in
+                                norm.split() if p not in self.entity_parts
+                                and p not in dictionary.unwanted_set and
                                 len(p) >= 5 and e.valid and
                                 abs(e.pos - self.entities[0].pos) < 500]
 
@@ -768,6 +1169,7 @@ class CandidateList(object):
         '''
         self.cluster = cluster
         self.model = model
+        self.plan = get_feature_plan(model.features)
 
         # Regular search (iteration #0)
         queries = self.get_queries(self.cluster.entities[0].norm,
@@ -797,10 +1199,10 @@ class CandidateList(object):
 
         # Search with OCR-error tolerance (iteration #3)
         if not candidates:
-            norm = utilities.normalize_ocr(self.cluster.entities[0].norm)
-            stripped = utilities.normalize_ocr(
+            norm = names.normalize_ocr(self.cluster.entities[0].norm)
+            stripped = names.normalize_ocr(
                 self.cluster.entities[0].stripped)
-            last_part = utilities.normalize_ocr(
+            last_part = names.normalize_ocr(
                 self.cluster.entities[0].last_part)
 
             queries = self.get_queries_ocr(norm, stripped, last_part)
@@ -810,6 +1212,20 @@ class CandidateList(object):
                 self.cluster.entities[0].set_norm(norm, stripped, last_part)
 
         self.candidates = candidates
+        self.set_matrix()
+
+    def set_matrix(self):
+        '''
+        Allocate the feature matrix, with one row per candidate and one
+        column per model feature, and let each candidate write its feature
+        values to its own row.
+        '''
+        self.matrix = np.zeros((len(self.candidates),
+                                len(self.model.features)))
+        for i, c in enumerate(self.candidates):
+            self.matrix[i] = c.row
+            c.row = self.matrix[i]
+            c.row_index = i
 
     def get_queries(self, norm, stripped, last_part):
         queries = []
@@ -835,6 +1251,20 @@ class CandidateList(object):
         return queries
 
     def query_solr(self, queries, iteration):
+        '''
+        Query Solr for candidate descriptions, using each next query only if
+        the previous ones returned less than SOLR_ROWS descriptions.
+        '''
+        # In concurrent mode, send all queries at once and ask each for the
+        # maximum number of rows; in combined mode, get the results of all
+        # queries with a single grouped request. The results are then merged
+        # as if the queries had been sent one after the other.
+        if SOLR_MODE == 'concurrent':
+            executor = get_executor('solr', SOLR_THREADS)
+            futures = [executor.submit(self.get_solr_docs, query, SOLR_ROWS,
+                                       iteration) for query in queries]
+        elif SOLR_MODE == 'combined':
+            groups = self.get_solr_groups(queries, iteration)
 
         candidates = []
 
@@ -844,21 +1274,12 @@ class CandidateList(object):
             else:
                 rows = SOLR_ROWS - len(candidates)
 
-            payload = {}
-            payload['q'] = query
-            payload['rows'] = rows
-            payload['sort'] = 'lang desc,inlinks desc'
-            payload['fl'] = '*,score'
-            payload['wt'] = 'json'
-
-            response = requests.get(SOLR_URL + 'query/?', params=payload,
-                                    timeout=300)
-
-            if response.status_code != 200:
-                raise IOError('Error retrieving Solr results from: {}'.format(
-                    SOLR_URL))
-
-            results = response.json()['response']['docs']
+            if SOLR_MODE == 'concurrent':
+                results = futures[query_id].result()[:rows]
+            elif SOLR_MODE == 'combined':
+                results = groups[query_id][:rows]
+            else:
+                results = self.get_solr_docs(query, rows, iteration)
 
             for r in results:
                 if (r.get('pref_label') and r.get('id') not in
@@ -868,30 +1289,211 @@ class CandidateList(object):
 
         return candidates
 
+    def get_solr_docs(self, query, rows, iteration):
+        '''
+        Get the top Solr results for a single query, from the cache if
+        available.
+        '''
+        if solr_cache:
+            docs = solr_cache.get([query, rows, iteration])
+            if docs is not None:
+                return docs
+
+        payload = {}
+        payload['q'] = query
+        payload['rows'] = rows
+        payload['sort'] = 'lang desc,inlinks desc'
+        payload['fl'] = '*,score'
+        payload['wt'] = 'json'
+
+        response = client.get('SOLR', SOLR_URL + 'query/?', params=payload)
+
+        if response.status_code != 200:
+            raise IOError('Error retrieving Solr results from: {}'.format(
+                SOLR_URL))
+
+        docs = response.json()['response']['docs']
+
+        if solr_cache:
+            solr_cache.set([query, rows, iteration], docs)
+
+        return docs
+
+    def get_solr_groups(self, queries, iteration):
+        '''
+        Get the top Solr results for all queries with a single request,
+        using one result group per query. Only queries without cached
+        results are included in the request.
+        '''
+        groups = {}
+        if solr_cache:
+            for query in queries:
+                docs = solr_cache.get([query, SOLR_ROWS, iteration])
+                if docs is not None:
+                    groups[query] = docs
+
+        missing = [q for q in queries if q not in groups]
+        if missing:
+            groups.update(self.request_solr_groups(missing))
+            if solr_cache:
+                for query in missing:
+                    solr_cache.set([query, SOLR_ROWS, iteration],
+                                   groups[query])
+
+        return [groups[query] for query in queries]
+
+    def request_solr_groups(self, queries):
+        '''
+        Request the grouped Solr results for a list of queries.
+        '''
+        payload = {}
+        payload['q'] = ' OR '.join(['(' + query + ')' for query in queries])
+        payload['rows'] = len(queries)
+        payload['group'] = 'true'
+        payload['group.query'] = queries
+        payload['group.limit'] = SOLR_ROWS
+        payload['group.sort'] = 'lang desc,inlinks desc'
+        payload['wt'] = 'json'
+
+        # The score of the combined query differs from the score of each
+        # separate query, so request the latter as pseudo-fields
+        fields = ['*']
+        for query_id, query in enumerate(queries):
+            payload['q{}'.format(query_id)] = query
+            fields.append('solr_score_{0}:query($q{0},-1)'.format(query_id))
+        payload['fl'] = ','.join(fields)
+
+        response = client.get('SOLR', SOLR_URL + 'query/?', params=payload)
+
+        if response.status_code != 200:
+            raise IOError('Error retrieving Solr results from: {}'.format(
+                SOLR_URL))
+
+        grouped = response.json()['grouped']
+
+        groups = {}
+        for query_id, query in enumerate(queries):
+            docs = grouped[query]['doclist']['docs']
+            for d in docs:
+                d['score'] = d['solr_score_{}'.format(query_id)]
+                for i in range(len(queries)):
+                    del d['solr_score_{}'.format(i)]
+            groups[query] = docs
+
+        return groups
+
     def filter(self):
         '''
         Filter descriptions according to hard criteria, e.g. name conflict.
         '''
         self.filtered_candidates = []
-        for c in self.candidates:
+        self.filtered_rows = []
+        for i, c in enumerate(self.candidates):
             c.set_rule_features()
             if c.match_str_conflict == 0 and c.match_txt_date > -1:
                 self.filtered_candidates.append(c)
+                self.filtered_rows.append(i)
 
     def rank(self):
         '''
         Rank candidates according to trained model.
         '''
+        examples = self.get_examples()
+
+        # Only calculate probs if not in training mode, scoring all
+        # candidates with a single model call
+        if self.model.__class__.__name__ != 'BaseModel':
+            self.set_probs(self.model.predict_batch(examples))
+        else:
+            self.set_probs()
+
+    def get_examples(self):
+        '''
+        Calculate the probability features of the filtered candidates and
+        return them as a matrix, one candidate per row.
+        '''
         for c in self.filtered_candidates:
             c.set_prob_features()
+        self.set_group_features(self.plan.group_steps,
+                                self.filtered_candidates)
+
+        return self.matrix[self.filtered_rows]
+
+    def rank_staged(self):
+        '''
+        Rank candidates according to trained model, calculating the features
+        depending on the topics and word2vec services only for candidates
+        that may still be the best match with a probability of at least
+        MIN_PROB. The probabilities of the other candidates are estimated
+        without these features, and marked as estimated.
+        '''
+        plan = self.plan
+        candidates = self.filtered_candidates
+
+        for c in candidates:
+            c.set_prob_features(plan.early_steps)
+        self.set_group_features(plan.early_group_steps, candidates)
+
+        bounds = None
+        if plan.bounded and (plan.deferred_steps or
+                             plan.deferred_group_steps):
+            bounds = self.model.upper_bounds(self.matrix[self.filtered_rows],
+                                             plan.deferred_columns,
+                                             plan.deferred_lows,
+                                             plan.deferred_highs)
+        if bounds is None:
+            bounds = np.ones(len(candidates))
+
+        # Evaluate the candidate with the highest bound first, then all
+        # candidates that may still beat it
+        pending = sorted(range(len(candidates)), key=lambda i: -bounds[i])
+        threshold = MIN_PROB
+        evaluated = []
+
+        while pending and bounds[pending[0]] + BOUND_MARGIN >= threshold:
+            if not evaluated:
+                batch = pending[:1]
+            else:
+                batch = [i for i in pending if
+                         bounds[i] + BOUND_MARGIN >= threshold]
+
+            batch_candidates = [candidates[i] for i in batch]
+            for c in batch_candidates:
+                c.set_prob_features(plan.deferred_steps)
+            self.set_group_features(plan.deferred_group_steps,
+                                    batch_candidates)
+            self.set_candidate_probs(batch_candidates)
+
+            threshold = max([threshold] + [c.prob for c in batch_candidates])
+            evaluated += batch
+            pending = [i for i in pending if i not in batch]
+
+        self.nr_rejected = len(pending)
+        if pending:
+            self.set_candidate_probs([candidates[i] for i in pending],
+                                     estimated=True)
 
-            # Only calculate prob if not in training mode
-            if self.model.__class__.__name__ != 'BaseModel':
-                example = []
-                for j in range(len(self.model.features)):
-                    feature = getattr(c, self.model.features[j])
-                    example.append(float(feature))
-                c.prob = self.model.predict(example)
+        self.set_probs()
+
+    def set_candidate_probs(self, candidates, estimated=False):
+        '''
+        Set the probabilities of the given candidates, estimated if some of
+        their features were not calculated.
+        '''
+        rows = [c.row_index for c in candidates]
+        probs = self.model.predict_batch(self.matrix[rows])
+        for c, prob in zip(candidates, probs):
+            c.prob = float(prob)
+            c.estimated = estimated
+
+    def set_probs(self, probs=None):
+        '''
+        Set the probabilities of the filtered candidates, if any, and sort
+        the candidates accordingly.
+        '''
+        if probs is not None:
+            for c, prob in zip(self.filtered_candidates, probs):
+                c.prob = float(prob)
 
         self.ranked_candidates = sorted(self.filtered_candidates,
                                         key=attrgetter('prob'), reverse=True)
@@ -914,11 +1516,165 @@ class CandidateList(object):
                             c.document.get(link_type)])
             setattr(self, 'sum_' + link_type, link_sum)
 
+    def set_group_features(self, steps, candidates):
+        '''
+        Set the feature values that are the same for the given candidates
+        or that can be calculated for all of them at once.
+        '''
+        for step in steps:
+            getattr(self, step)(candidates)
+
+    def set_entity_type(self, candidates):
+        '''
+        Set the entity type features.
+        '''
+        if not hasattr(self.cluster, 'type_ratios'):
+            self.cluster.get_type_ratios()
+        type_ratios = self.cluster.type_ratios
+
+        rows = [c.row_index for c in candidates]
+        for tr in type_ratios:
+            col = self.model.feature_index.get('entity_type_' + tr)
+            if col is not None:
+                self.matrix[rows, col] = type_ratios[tr]
+
+    def set_entity_topic(self, candidates):
+        '''
+        Set the entity topic features.
+        '''
+        if not hasattr(self.cluster.context, 'topics'):
+            self.cluster.context.get_topics()
+        topics = self.cluster.context.topics
+
+        rows = [c.row_index for c in candidates]
+        if topics:
+            for t in topics:
+                col = self.model.feature_index.get('entity_topic_' + t)
+                if col is not None:
+                    self.matrix[rows, col] = topics[t]
+
+    def set_topic_match(self, candidates):
+        '''
+        Match the topics identified for the article with the topics of the
+        given candidates.
+        '''
+        topics = self.cluster.context.topics
+        topics_arr = np.array([topics[t] for t in
+                               dictionary.topics]).reshape(1, -1)
+        desc_topics_arr = np.array([[c.description_topics[t] for t in
+                                     dictionary.topics] for c in candidates])
+
+        sims = vectors.cosine_similarity(topics_arr, desc_topics_arr)[0]
+        for c, sim in zip(candidates, sims):
+            c.match_txt_topic = sim - 0.25
+
+    def set_vector_match(self, candidates):
+        '''
+        Match context word vectors with the abstract word vectors of the
+        given candidates.
+        '''
+        evf = self.plan.has('entity_vec*')
+        mvf = self.plan.has('match_txt_vec*')
+
+        candidates = [c for c in candidates if
+                      c.document.get('lang') == 'nl']
+        if not candidates:
+            return
+
+        if not hasattr(self.cluster, 'window'):
+            self.cluster.get_window()
+        if not self.cluster.window:
+            return
+
+        if not hasattr(self.cluster, 'window_vectors'):
+            self.cluster.window_vectors = w2v.get_vectors(self.cluster.window)
+        if not self.cluster.window_vectors:
+            return
+
+        window_vectors = np.array(self.cluster.window_vectors)
+
+        if evf:
+            # Take mean of window vectors for now, need to find better
+            # representation
+            entity_vector = np.mean(window_vectors, axis=0).tolist()
+            for c in candidates:
+                for i, v in enumerate(entity_vector):
+                    setattr(c, 'entity_vec_' + str(i), v)
+
+        if not mvf:
+            return
+
+        cand_vectors = [doc_vectors.get_vectors(c.document, 'abstract_vector')
+                        for c in candidates]
+        candidates = [c for c, v in zip(candidates, cand_vectors) if
+                      v is not None]
+        cand_vectors = [v for v in cand_vectors if v is not None]
+        if not candidates:
+            return
+
+        # Compare with the abstract vectors of all candidates at once
+        sims = vectors.cosine_similarity(window_vectors,
+                                         np.vstack(cand_vectors))
+
+        start = 0
+        for c, v in zip(candidates, cand_vectors):
+            cand_sims = sims[:, start:start + len(v)]
+            start += len(v)
+            c.match_txt_vec_max = cand_sims.max() - 0.375
+            c.match_txt_vec_mean = cand_sims.mean() - 0.0625
+
+    def set_entity_vector_match(self, candidates):
+        '''
+        Match word vectors for other entities in the article with the entity
+        vectors of the given candidates.
+        '''
+        cvf = self.plan.has('candidate_vec*')
+        mvf = self.plan.has('match_txt_entity_vec*')
+
+        cand_vectors = [doc_vectors.get_vectors(c.document, 'vector') for c
+                        in candidates]
+        candidates = [c for c, v in zip(candidates, cand_vectors) if
+                      v is not None]
+        cand_vectors = [v[0] for v in cand_vectors if v is not None]
+        if not candidates:
+            return
+
+        if cvf:
+            for c, v in zip(candidates, cand_vectors):
+                for i, x in enumerate(v):
+                    setattr(c, 'candidate_vec_' + str(i), x)
+
+        if not mvf:
+            return
+
+        if not hasattr(self.cluster, 'context_entity_parts'):
+            self.cluster.get_context_entity_parts()
+        if not self.cluster.context_entity_parts:
+            return
+
+        if not hasattr(self.cluster, 'context_entity_vectors'):
+            self.cluster.context_entity_vectors = w2v.get_vectors(
+                self.cluster.context_entity_parts)
+        if not self.cluster.context_entity_vectors:
+            return
+
+        # Compare with the entity vectors of all candidates at once
+        sims = vectors.cosine_similarity(
+            np.array(self.cluster.context_entity_vectors),
+            np.vstack(cand_vectors))
+
+        for j, c in enumerate(candidates):
+            c.match_txt_entity_vec_max = sims[:, j].max() - 0.375
+            c.match_txt_entity_vec_mean = sims[:, j].mean() - 0.125
+
 
 class Description(object):
     '''
-    Description of a link candidate.
+    Description of a link candidate. Feature values are stored in a row of
+    the feature matrix of the candidate list.
     '''
+    feature_index = {}
+
     def __init__(self, document, iteration, query_id, cand_list,
                  cluster):
         '''
@@ -930,10 +1686,30 @@ class Description(object):
         self.cand_list = cand_list
         self.cluster = cluster
         self.prob = 0.0
+        self.estimated = False
 
         self.features = self.cand_list.model.features
-        for f in self.features:
-            setattr(self, f, 0)
+        self.feature_index = self.cand_list.model.feature_index
+        self.plan = self.cand_list.plan
+        self.row = np.zeros(len(self.features))
+
+    def __getattr__(self, name):
+        '''
+        Get a feature value from the feature matrix row.
+        '''
+        if name in self.feature_index:
+            return self.row[self.feature_index[name]]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        '''
+        Set feature values in the feature matrix row, other attributes as
+        usual.
+        '''
+        if name in self.feature_index:
+            self.row[self.feature_index[name]] = value
+        else:
+            object.__setattr__(self, name, value)
 
     def set_rule_features(self):
         '''
@@ -1153,46 +1929,19 @@ class Description(object):
         else:
             self.match_str_conflict = 1
 
-    def set_prob_features(self):
+    def set_prob_features(self, steps=None):
         '''
         Set the additional feature values needed for probability-based
-        candidate ranking.
-        '''
-        # Mention representation
-        self.set_entity_quotes()
-        self.set_entity_confidence()
-        self.set_entity_article_type()
-
-        # Description representation
-        self.set_candidate_lang()
-        self.set_candidate_ambig()
-        self.set_candidate_inlinks()
-
-        # Mention - description string match
-        self.set_solr_properties()
-        self.set_levenshtein()
-        self.set_abbr_match()
-
-        # Mention - description context match
-        self.set_txt_labels_match()
-        self.set_spec_match()
-        self.set_keyword_match()
-        self.set_title_match()
-        self.set_role_match()
-        self.set_type_match()
-        self.set_topic_match()
-        self.set_vector_match()
-        self.set_entity_match()
-        # self.set_entity_match_newspapers()
-        self.set_entity_vector_match()
+        candidate ranking, running only the steps needed for the model
+        features, or the given steps.
+        '''
+        for step in (self.plan.steps if steps is None else steps):
+            getattr(self, step)()
 
     def set_entity_quotes(self):
         '''
         Count number of quotes surrounding entity mentions.
         '''
-        if 'entity_quotes' not in self.features:
-            return
-
         if not hasattr(self.cluster, 'sum_quotes'):
             self.cluster.sum_quotes = sum([e.quotes for e in
                                            self.cluster.entities])
@@ -1203,9 +1952,6 @@ class Description(object):
         '''
         Calculate the mean NER confidence for the cluster.
         '''
-        if 'entity_ner_confidence' not in self.features:
-            return
-
         if not hasattr(self.cluster, 'mean_ner_confidence'):
             self.cluster.mean_ner_confidence = (sum([e.count for e in
                                                      self.cluster.entities]) /
@@ -1218,9 +1964,7 @@ class Description(object):
         '''
         Set article type features.
         '''
-        atf = [f for f in self.features if f.startswith('entity_article_type')]
-
-        if atf and self.cluster.context.article_type:
+        if self.cluster.context.article_type:
             setattr(self, 'entity_article_type_' +
                     self.cluster.context.article_type[:3], 1.0)
 
@@ -1228,27 +1972,18 @@ class Description(object):
         '''
         Determine if description is available in Dutch.
         '''
-        if 'candidate_lang' not in self.features:
-            return
-
         self.candidate_lang = 1 if self.document.get('lang') == 'nl' else -1
 
     def set_candidate_ambig(self):
         '''
         Determine if the description label is ambiguous.
         '''
-        if 'candidate_ambig' not in self.features:
-            return
-
         self.candidate_ambig = 1 if self.document.get('ambig') == 1 else -1
 
     def set_candidate_inlinks(self):
         '''
         Determine inlinks feature values.
         '''
-        if not [f for f in self.features if f.startswith('candidate_inlinks')]:
-            return
-
         for link_type in ['inlinks', 'inlinks_newspapers']:
             link_count = self.document.get(link_type)
             if link_count:
@@ -1266,9 +2001,6 @@ class Description(object):
         '''
         Determine Solr iteration, position and score.
         '''
-        if not [f for f in self.features if f.startswith('match_str_solr')]:
-            return
-
         # Solr query
         setattr(self, 'match_str_solr_query_{}'.format(self.query_id), 1)
 
@@ -1290,9 +2022,6 @@ class Description(object):
         '''
         Mean and max Levenshtein ratio for all labels.
         '''
-        if not [f for f in self.features if f.startswith('match_str_lsr')]:
-            return
-
         ne = self.cluster.entities[0].norm
 
         # Pref label
@@ -1323,15 +2052,11 @@ class Description(object):
         '''
         Match abbreviations with labels, initials of labels, abstract.
         '''
-        if not [f for f in self.features if f.startswith('match_str_abbr') or
-                f.startswith('entity_abbr')]:
-            return
-
         ne = self.cluster.entities[0]
         if (ne.text.isupper() and len(ne.norm) <= 5 and
                 len(ne.norm.split()) == 1):
 
-            if 'entity_abbr' in self.features:
+            if self.plan.has('entity_abbr'):
                 self.entity_abbr = 1
 
             # Exactly match pref or alt label
@@ -1359,9 +2084,6 @@ class Description(object):
         '''
         Find labels longer than the entity in the article text.
         '''
-        if 'match_txt_labels' not in self.features:
-            return
-
         ne = self.cluster.entities[0].norm
 
         labels = []
@@ -1384,9 +2106,6 @@ class Description(object):
         '''
         Find the specification (between brackets) in the article text.
         '''
-        if 'match_txt_spec' not in self.features:
-            return
-
         spec = self.document.get('spec')
         if spec:
             spec_stem = spec[:int(math.ceil(len(spec) * 0.8))]
@@ -1402,15 +2121,12 @@ class Description(object):
         '''
         Find DBpedia category keywords in the article text.
         '''
-        if 'match_txt_keyword' not in self.features:
-            return
-
         if not self.document.get('keyword'):
             return
 
         key_stems = [w[:int(math.ceil(len(w) * 0.8))] for w in
                      self.document.get('keyword') if w not in
-                     dictionary.unwanted]
+                     dictionary.unwanted_set]
         if not key_stems:
             return
 
@@ -1423,9 +2139,6 @@ class Description(object):
         '''
         Match exact title and role form with DBpedia abstract.
         '''
-        if 'match_txt_title' not in self.features:
-            return
-
         abstract = self.document.get('abstract_norm')
         if not abstract:
             return
@@ -1442,9 +2155,6 @@ class Description(object):
         '''
         Match entity and description role (politician, athlete, etc.).
         '''
-        if 'match_txt_role' not in self.features:
-            return
-
         roles = {e.role for e in self.cluster.entities if e.role}
         if not roles:
             return
@@ -1455,18 +2165,18 @@ class Description(object):
             dbo_types += self.document.get('dbo_type')
 
         if dbo_types:
-            for role in roles:
-                for t in dictionary.roles_dbo[role]:
-                    if t in dbo_types:
-                        self.match_txt_role = 1
-                        return
+            dbo_roles = set()
+            for t in dbo_types:
+                dbo_roles |= dictionary.roles_by_dbo.get(t, set())
+
+            if dbo_roles & roles:
+                self.match_txt_role = 1
+                return
 
             # Check for conflict
-            for role in [r for r in dictionary.roles_dbo if r not in roles]:
-                for t in dictionary.roles_dbo[role]:
-                    if t in dbo_types:
-                        self.match_txt_role = -1
-                        return
+            if dbo_roles - roles:
+                self.match_txt_role = -1
+                return
 
         else:
             if not hasattr(self, 'topic_probs'):
@@ -1492,21 +2202,14 @@ class Description(object):
         '''
         Match entity and description type (person, location or organization).
         '''
-        etf = [f for f in self.features if f.startswith('entity_type')]
-        ctf = [f for f in self.features if f.startswith('candidate_type')]
-        mtf = [f for f in self.features if f.startswith('match_txt_type')]
-        if not (etf or ctf or mtf):
-            return
+        ctf = self.plan.has('candidate_type*')
+        mtf = self.plan.has('match_txt_type*')
 
-        # Set entity type features
+        # Entity type features are set for all candidates at once
         if not hasattr(self.cluster, 'type_ratios'):
             self.cluster.get_type_ratios()
         type_ratios = self.cluster.type_ratios
 
-        if etf:
-            for tr in type_ratios:
-                setattr(self, 'entity_type_' + tr, type_ratios[tr])
-
         if ctf or mtf:
             # Set candidate type features
             description_types = {t: 0.0 for t in dictionary.types_dbo}
@@ -1517,9 +2220,8 @@ class Description(object):
 
             if dbo_types:
                 for t in dbo_types:
-                    for r in dictionary.types_dbo:
-                        if t in dictionary.types_dbo[r]:
-                            description_types[r] = 1.0
+                    for r in dictionary.types_by_dbo.get(t, []):
+                        description_types[r] = 1.0
 
                 if not sum(description_types.values()):
                     description_types['other'] = 1.0
@@ -1566,22 +2268,16 @@ class Description(object):
 
     def set_topic_match(self):
         '''
-        Match the topics identified for the article with the DBpedia
-        abstract.
+        Set the DBpedia abstract topics to be matched with the topics
+        identified for the article.
         '''
-        etf = [f for f in self.features if f.startswith('entity_topic')]
-        ctf = [f for f in self.features if f.startswith('candidate_topic')]
-        mtf = [f for f in self.features if f.startswith('match_txt_topic')]
-        if not (etf or ctf or mtf):
-            return
+        ctf = self.plan.has('candidate_topic*')
+        mtf = self.plan.has('match_txt_topic*')
 
+        # Entity topic features and the topic match are set for all
+        # candidates at once
         if not hasattr(self.cluster.context, 'topics'):
             self.cluster.context.get_topics()
-        topics = self.cluster.context.topics
-
-        if topics and etf:
-            for t in topics:
-                setattr(self, 'entity_topic_' + t, topics[t])
 
         if ctf or mtf:
 
@@ -1594,10 +2290,8 @@ class Description(object):
 
             if dbo_types:
                 for t in dbo_types:
-                    for r in dictionary.roles_dbo:
-                        if (t in dictionary.roles_dbo[r] and r.split('_')[0] in
-                                description_topics):
-                            description_topics[r.split('_')[0]] = 1.0
+                    for r in dictionary.topics_by_dbo.get(t, []):
+                        description_topics[r] = 1.0
 
             # Predict topic(s) from abstract
             if not sum(description_topics.values()):
@@ -1610,67 +2304,12 @@ class Description(object):
                     setattr(self, 'candidate_topic_' + t,
                             description_topics[t])
 
-            if mtf:
-                topics_arr = np.array([topics[t] for t in
-                                       dictionary.topics]).reshape(1, -1)
-                desc_topics_arr = np.array([description_topics[t] for t in
-                                            dictionary.topics]).reshape(1, -1)
-
-                self.match_txt_topic = cosine_similarity(
-                    topics_arr, desc_topics_arr)[0][0] - 0.25
-
-    def set_vector_match(self):
-        '''
-        Match context word vectors with abstract word vectors.
-        '''
-        if not self.document.get('lang') == 'nl':
-            return
-
-        evf = [f for f in self.features if f.startswith('entity_vec')]
-        mvf = [f for f in self.features if f.startswith('match_txt_vec')]
-        if not (evf or mvf):
-            return
-
-        if not hasattr(self.cluster, 'window'):
-            self.cluster.get_window()
-        if not self.cluster.window:
-            return
-
-        if not hasattr(self.cluster, 'window_vectors'):
-            self.cluster.window_vectors = self.get_vectors(self.cluster.window)
-        if not self.cluster.window_vectors:
-            return
-
-        if evf:
-            # Take mean of window vectors for now, need to find better
-            # representation
-            window_vectors_array = np.array(self.cluster.window_vectors)
-            entity_vector = np.mean(window_vectors_array, axis=0).tolist()
-            for i, v in enumerate(entity_vector):
-                setattr(self, 'entity_vec_' + str(i), v)
-
-        if not mvf:
-            return
-
-        if 'abstract_vector' in self.document:
-            cand_vectors = [json.loads(v) for v in
-                            self.document.get('abstract_vector')]
-        else:
-            return
-
-        sims = cosine_similarity(np.array(self.cluster.window_vectors),
-                                 np.array(cand_vectors))
-
-        self.match_txt_vec_max = sims.max() - 0.375
-        self.match_txt_vec_mean = sims.mean() - 0.0625
+            self.description_topics = description_topics
 
     def set_entity_match(self):
         '''
         Match other entities appearing in the article with DBpedia abstract.
         '''
-        if 'match_txt_entities' not in self.features:
-            return
-
         if not hasattr(self.cluster, 'entity_parts'):
             self.cluster.get_entity_parts()
         if not hasattr(self.cluster, 'context_entity_parts'):
@@ -1742,7 +2381,8 @@ class Description(object):
         payload['query'] = query
 
         try:
-            response = requests.get(JSRU_URL, params=payload, timeout=60)
+            response = client.get('JSRU', JSRU_URL, params=payload,
+                                  timeout=60)
             xml = etree.fromstring(response.content)
             tag = '{http://www.loc.gov/zing/srw/}numberOfRecords'
             num_records = int(xml.find(tag).text)
@@ -1751,59 +2391,6 @@ class Description(object):
         except Exception:
             return
 
-    def set_entity_vector_match(self):
-        '''
-        Match word vectors for other entities in the article with
-        entity vector.
-        '''
-        cvf = [f for f in self.features if f.startswith('candidate_vec')]
-        mvf = [f for f in self.features if
-               f.startswith('match_txt_entity_vec')]
-        if not (cvf or mvf):
-            return
-
-        if 'vector' in self.document:
-            cand_vectors = [json.loads(self.document.get('vector'))]
-        else:
-            return
-
-        if cvf:
-            for i, v in enumerate(cand_vectors[0]):
-                setattr(self, 'candidate_vec_' + str(i), v)
-
-        if not mvf:
-            return
-
-        if not hasattr(self.cluster, 'context_entity_parts'):
-            self.cluster.get_context_entity_parts()
-        if not self.cluster.context_entity_parts:
-            return
-
-        if not hasattr(self.cluster, 'context_entity_vectors'):
-            self.cluster.context_entity_vectors = self.get_vectors(
-                self.cluster.context_entity_parts)
-        if not self.cluster.context_entity_vectors:
-            return
-
-        sims = cosine_similarity(np.array(self.cluster.context_entity_vectors),
-                                 np.array(cand_vectors))
-        self.match_txt_entity_vec_max = sims.max() - 0.375
-        self.match_txt_entity_vec_mean = sims.mean() - 0.125
-
-    def get_vectors(self, wordlist):
-        '''
-        Get word vectors for given word list.
-        '''
-        payload = {'source': ' '.join(wordlist)}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-
-        if response.status_code != 200:
-            raise IOError('Error retrieving word vectors from: {}'.format(
-                W2V_URL))
-
-        data = response.json()
-        return data['vectors']
-
     def get_topics(self):
         '''
         Get topics and type from classifier service.
@@ -1829,6 +2416,7 @@ class Result(object):
         self.reason = reason
         self.prob = prob
         self.description = description
+        self.estimated = description.estimated if description else False
 
         self.link = None
         self.label = None
@@ -1836,9 +2424,8 @@ class Result(object):
         self.candidates = None
 
         if description:
-            self.features = {}
-            for f in description.features:
-                self.features[f] = float(getattr(description, f))
+            self.features = dict(zip(description.features,
+                                     description.row.tolist()))
             if self.reason == 'Predicted link':
                 self.link = description.document.get('id')
                 self.label = description.document.get('label')
@@ -1851,9 +2438,10 @@ class Result(object):
                 d = {}
                 d['id'] = description.document.get('id')
                 d['prob'] = description.prob
-                d['features'] = {}
-                for f in description.features:
-                    d['features'][f] = float(getattr(description, f))
+                if description.estimated:
+                    d['estimated'] = True
+                d['features'] = dict(zip(description.features,
+                                         description.row.tolist()))
                 d['document'] = description.document
                 self.candidates.append(d)
 
@@ -1865,6 +2453,8 @@ class Result(object):
         result['reason'] = self.reason
         if self.prob:
             result['prob'] = '{0:.10f}'.format(self.prob)
+        if self.estimated:
+            result['estimated'] = True
         if self.link:
             result['link'] = self.link
         if self.label:
@@ -1899,13 +2489,33 @@ if __name__ == '__main__':
                         action='store_true', help='return candidate list')
     parser.add_argument('-e', '--errh', required=False, action='store_true',
                         help='turn on error handling')
+    parser.add_argument('-b', '--batch', required=False, action='store_true',
+                        help='score the candidates of all entities at once')
+    parser.add_argument('-a', '--async', required=False, action='store_true',
+                        help='send independent service requests '
+                        'concurrently, implies -b and -t')
+    parser.add_argument('-t', '--topics', required=False, action='store_true',
+                        help='retrieve article topics in advance')
+    parser.add_argument('-s', '--staged', required=False, action='store_true',
+                        help='skip expensive features for unlikely candidates')
 
     args = parser.parse_args()
 
-    linker = EntityLinker(model=vars(args)['model'],
-                          debug=vars(args)['debug'],
-                          features=vars(args)['features'],
-                          candidates=vars(args)['candidates'],
-                          error_handling=vars(args)['errh'])
+    if vars(args)['async']:
+        linker = AsyncEntityLinker(model=vars(args)['model'],
+                                   debug=vars(args)['debug'],
+                                   features=vars(args)['features'],
+                                   candidates=vars(args)['candidates'],
+                                   error_handling=vars(args)['errh'],
+                                   staged=vars(args)['staged'])
+    else:
+        linker = EntityLinker(model=vars(args)['model'],
+                              debug=vars(args)['debug'],
+                              features=vars(args)['features'],
+                              candidates=vars(args)['candidates'],
+                              error_handling=vars(args)['errh'],
+                              batch=vars(args)['batch'],
+                              prefetch_topics=vars(args)['topics'],
+                              staged=vars(args)['staged'])
 
     pprint(linker.link(vars(args)['url'], vars(args)['ne']))
@@ -145,3 +145,100 @@ roles_vocab = {
     'science_concept': [],
     'sports_concept': ['wedstrijd', 'toernooi', 'competitie']
 }
+
+# Lookup structures compiled from the vocabularies above. If a word matches
+# more than one entry, the entry found first when scanning the vocabulary
+# wins, so the results are the same as those of a linear scan.
+
+titles_set = frozenset(titles)
+months_set = frozenset(months)
+unwanted_set = frozenset(unwanted)
+
+
+def compile_forms(vocab, inflections):
+    '''
+    Map each vocabulary word and its inflected forms to the position and
+    key of the first entry producing it.
+    '''
+    forms = {}
+    entries = [(k, w) for k in vocab for w in vocab[k]]
+    for i, (key, word) in enumerate(entries):
+        for form in [word] + [word + s for s in inflections]:
+            forms.setdefault(form, (i, key))
+    return forms
+
+
+def compile_trie(vocab, min_length=0, reverse=False):
+    '''
+    Build a character trie of the vocabulary words of at least min_length
+    characters, storing the position and key of the first entry ending at
+    each node under None. Words are reversed for suffix lookups.
+    '''
+    trie = {}
+    entries = [(k, w) for k in vocab for w in vocab[k]]
+    for i, (key, word) in enumerate(entries):
+        if len(word) < min_length:
+            continue
+        node = trie
+        for c in (reversed(word) if reverse else word):
+            node = node.setdefault(c, {})
+        node.setdefault(None, (i, key))
+    return trie
+
+
+def search_trie(trie, chars):
+    '''
+    Walk the trie along a sequence of characters, returning the entries of
+    all words that form a prefix of the sequence.
+    '''
+    matches = []
+    node = trie
+    for c in chars:
+        node = node.get(c)
+        if node is None:
+            break
+        if None in node:
+            matches.append(node[None])
+    return matches
+
+
+def invert(vocab):
+    '''
+    Map each value in a dictionary of lists to the set of keys listing it.
+    '''
+    inverted = {}
+    for key in vocab:
+        for value in vocab[key]:
+            inverted.setdefault(value, set()).add(key)
+    return inverted
+
+
+roles_forms = compile_forms(roles_vocab, ['s', 'en'])
+roles_suffixes = compile_trie(roles_vocab, min_length=5, reverse=True)
+types_words = compile_trie(types_vocab)
+
+roles_by_dbo = invert(roles_dbo)
+types_by_dbo = invert(types_dbo)
+topics_by_dbo = {t: {r.split('_')[0] for r in roles_by_dbo[t]} &
+                 set(topics) for t in roles_by_dbo}
+
+
+def find_role(word):
+    '''
+    Get the role of a word that equals a role word, possibly followed by
+    -s or -en, or ends with a role word of at least five characters.
+    '''
+    matches = search_trie(roles_suffixes, reversed(word))
+    if word in roles_forms:
+        matches.append(roles_forms[word])
+    return min(matches)[1] if matches else None
+
+
+def find_type(word):
+    '''
+    Get the type of a word containing a type word.
+    '''
+    matches = []
+    for i in range(len(word)):
+        matches += search_trie(types_words, word[i:])
+    return min(matches)[1] if matches else None
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+
+import numpy as np
+
+# Activation functions
+activations = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(x * -1)),
+    'tanh': np.tanh
+}
+
+
+class Layer(object):
+    '''
+    A layer of a network exported from Keras, with the Keras layer
+    configuration and weights.
+    '''
+
+    def __init__(self, config, weights, inbound):
+        '''
+        Initialize the layer with the names of its input layers.
+        '''
+        self.config = config
+        self.weights = weights
+        self.inbound = inbound
+        self.name = config['name']
+
+    def get_config(self):
+        return self.config
+
+    def get_weights(self):
+        return self.weights
+
+
+class InputLayer(Layer):
+    def call(self, inputs):
+        return inputs[0]
+
+
+class Dense(Layer):
+    def __init__(self, config, weights, inbound):
+        super(Dense, self).__init__(config, weights, inbound)
+        activation = config.get('activation', 'linear')
+        if activation not in activations:
+            raise ValueError('Unsupported activation: {}'.format(activation))
+        self.activation = activations[activation]
+
+    def call(self, inputs):
+        x = inputs[0].dot(self.weights[0])
+        if len(self.weights) > 1:
+            x += self.weights[1]
+        return self.activation(x)
+
+
+class Activation(Layer):
+    def call(self, inputs):
+        return activations[self.config['activation']](inputs[0])
+
+
+class Dropout(Layer):
+    def call(self, inputs):
+        # Dropout layers don't change values at prediction time
+        return inputs[0]
+
+
+class Concatenate(Layer):
+    def call(self, inputs):
+        return np.concatenate(inputs, axis=self.config.get('axis', -1))
+
+
+layer_classes = {c.__name__: c for c in [InputLayer, Dense, Activation,
+                                         Dropout, Concatenate]}
+
+
+class NumpyModel(object):
+    '''
+    Forward pass of a Keras Sequential or functional model of dense layers,
+    computed with NumPy from the weights exported by export.
+    '''
+
+    def __init__(self, path):
+        '''
+        Load the model configuration and weights.
+        '''
+        data = np.load(path)
+        config = json.loads(data['config'].tobytes().decode('utf-8'))
+
+        self.layers = []
+        names = []
+        for layer_config in get_layer_configs(config):
+            class_name = layer_config['class_name']
+            if class_name not in layer_classes:
+                raise ValueError('Unsupported layer: {}'.format(class_name))
+
+            name = layer_config['config']['name']
+            weights = []
+            while '{}/{}'.format(name, len(weights)) in data.files:
+                weights.append(data['{}/{}'.format(name, len(weights))])
+
+            # Layers of a Sequential model take the previous layer as input
+            if 'inbound_nodes' in layer_config:
+                nodes = layer_config['inbound_nodes']
+                inbound = [n[0] for n in nodes[0]] if nodes else []
+            else:
+                inbound = names[-1:]
+
+            self.layers.append(layer_classes[class_name](
+                layer_config['config'], weights, inbound))
+            names.append(name)
+
+        if (isinstance(config['config'], dict) and
+                'input_layers' in config['config']):
+            self.inputs = [n[0] for n in config['config']['input_layers']]
+            self.outputs = [n[0] for n in config['config']['output_layers']]
+        else:
+            # The first layer of a Sequential model takes the input directly
+            self.inputs = []
+            self.outputs = names[-1:]
+
+    def predict(self, x, batch_size=None):
+        '''
+        Predict the output for an input matrix, or a list of input
+        matrices for models with multiple inputs.
+        '''
+        if not isinstance(x, list):
+            x = [x]
+        x = [np.asarray(v, dtype=np.float32) for v in x]
+
+        values = dict(zip(self.inputs, x))
+        for layer in self.layers:
+            if layer.name in values:
+                continue
+            if layer.inbound:
+                inputs = [values[n] for n in layer.inbound]
+            else:
+                inputs = x
+            values[layer.name] = layer.call(inputs)
+
+        return values[self.outputs[0]]
+
+
+def get_layer_configs(config):
+    '''
+    Get the layer configurations from a Keras model configuration.
+    '''
+    if isinstance(config['config'], list):
+        return config['config']
+    return config['config']['layers']
+
+
+def export(h5_path, path):
+    '''
+    Export the configuration and weights of a Keras model file to a NumPy
+    npz file.
+    '''
+    import h5py
+
+    with h5py.File(h5_path, 'r') as f:
+        config = f.attrs['model_config']
+        if isinstance(config, bytes):
+            config = config.decode('utf-8')
+
+        arrays = {'config': np.frombuffer(config.encode('utf-8'),
+                                          dtype=np.uint8)}
+
+        weights = f['model_weights'] if 'model_weights' in f else f
+        for layer_config in get_layer_configs(json.loads(config)):
+            name = layer_config['config']['name']
+            if name not in weights:
+                continue
+            group = weights[name]
+            for i, weight_name in enumerate(group.attrs['weight_names']):
+                if isinstance(weight_name, bytes):
+                    weight_name = weight_name.decode('utf-8')
+                arrays['{}/{}'.format(name, i)] = group[weight_name][()]
+
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('input', type=str, help='Keras model file')
+    parser.add_argument('output', type=str, help='NumPy model file')
+
+    args = parser.parse_args()
+
+    export(vars(args)['input'], vars(args)['output'])
@@ -20,31 +20,18 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import gc
 import json
-import math
 import os
+import threading
 
 import numpy as np
-import pandas as pd
-
-from keras.constraints import maxnorm
-from keras.layers import concatenate
-from keras.layers import Dense
-from keras.layers import Dropout
-from keras.layers import Input
-from keras.models import load_model
-from keras.models import Model
-from keras.models import Sequential
-
-from sklearn import preprocessing
-from sklearn import svm
-from sklearn.externals import joblib
-from sklearn.metrics import accuracy_score
-from sklearn.metrics import f1_score
-from sklearn.metrics import precision_score
-from sklearn.metrics import recall_score
-from sklearn.model_selection import StratifiedShuffleSplit
 
+import inference
+
+# Keras (TensorFlow), scikit-learn and pandas take long to import, so these
+# are only imported by the methods that need them, e.g. for training or
+# when a model hasn't been exported for prediction with NumPy
 
 abs_path = os.path.dirname(os.path.realpath(__file__))
 training_file = os.path.join(abs_path, 'training', 'training.csv')
@@ -59,28 +46,105 @@ class BaseModel(object):
     def __init__(self):
         self.features = self.load_features('features.json')
 
+    @classmethod
+    def is_fork_safe(cls):
+        '''
+        Determine if the model can be loaded before the process is forked,
+        e.g. in the uwsgi master process.
+        '''
+        return True
+
     def load_features(self, feature_file):
+        '''
+        Load the feature names and set the column index of each feature in
+        the candidate feature matrix.
+        '''
         path = feature_file_template.format(feature_file)
-        return json.load(open(path))['features']
+        features = json.load(open(path))['features']
+        self.feature_index = {f: i for i, f in enumerate(features)}
+        return features
+
+    def upper_bounds(self, examples, columns, lows, highs):
+        '''
+        Get an upper bound on the probability of each example, for any
+        values of the given feature columns within the given ranges. Return
+        None if the model can't provide bounds.
+        '''
+        return None
 
 
 class LinearSVM(BaseModel):
-    def __init__(self, train=False):
+    '''
+    Linear support vector machine trained with scikit-learn. For
+    prediction, only the feature weights and intercept are needed, which
+    are read from a small NumPy file if it has been exported.
+    '''
+    model_file = model_file_template.format('svm.pkl')
+    numpy_file = model_file_template.format('svm.npz')
+
+    def __init__(self, train=False, sklearn=False):
         self.features = self.load_features('svm.json')
-        self.model_file = model_file_template.format('svm.pkl')
+        self.model = None
+        self.coef = None
+        self.intercept = None
 
         if train:
+            from sklearn import svm
+
             self.load_csv()
             self.model = svm.SVC(kernel='linear', C=1.5,
                                  decision_function_shape='ovr',
                                  class_weight={0: 0.25, 1: 0.75})
+        elif not sklearn and os.path.isfile(self.numpy_file):
+            data = np.load(self.numpy_file)
+            self.coef = data['coef']
+            self.intercept = float(data['intercept'])
         else:
+            from sklearn.externals import joblib
+
             self.model = joblib.load(self.model_file)
+            self.set_weights()
+
+    def set_weights(self):
+        '''
+        Get the feature weights and intercept of the scikit-learn model, if
+        it has a linear kernel.
+        '''
+        if self.model.kernel == 'linear':
+            self.coef = np.asarray(self.model.coef_, dtype=float)[0]
+            self.intercept = float(self.model.intercept_[0])
+        else:
+            self.coef = None
+            self.intercept = None
+
+    def export(self):
+        '''
+        Save the feature weights and intercept for prediction without
+        scikit-learn, and compare the decision function of both on random
+        examples.
+        '''
+        if self.coef is None:
+            print('Only models with a linear kernel can be exported')
+            return
+
+        print('Exporting model: {}'.format(self.numpy_file))
+        with open(self.numpy_file, 'wb') as f:
+            np.savez(f, coef=self.coef, intercept=self.intercept)
+
+        examples = np.random.rand(1000, len(self.features))
+        sklearn_dec = self.model.decision_function(examples)
+        numpy_dec = self.decision_function(examples)
+
+        print('Max. difference: {}'.format(
+            np.abs(sklearn_dec - numpy_dec).max()))
 
     def load_csv(self):
         '''
         Transform tabular data set into NumPy arrays.
         '''
+        import pandas as pd
+        from sklearn import preprocessing
+
         print('Loading training set: {}'.format(training_file))
         df = pd.read_csv(training_file, sep='\t')
 
@@ -98,13 +162,23 @@ class LinearSVM(BaseModel):
         print('Training new model: {}()'.format(self.__class__.__name__))
         self.model.fit(self.data, self.labels)
 
+        from sklearn.externals import joblib
+
         print('Saving model: {}'.format(self.model_file))
         joblib.dump(self.model, self.model_file)
+        self.set_weights()
+        self.export()
 
     def validate(self):
         '''
         Ten-fold cross-validation with stratified sampling.
         '''
+        from sklearn.metrics import accuracy_score
+        from sklearn.metrics import f1_score
+        from sklearn.metrics import precision_score
+        from sklearn.metrics import recall_score
+        from sklearn.model_selection import StratifiedShuffleSplit
+
         print('Validating new model: {}()'.format(self.__class__.__name__))
 
         accuracy_scores = []
@@ -134,32 +208,123 @@ class LinearSVM(BaseModel):
         Print model feature weights.
         '''
         for i, f in enumerate(self.features):
-            print(f, self.model.coef_[:, i][0])
+            print(f, self.coef[i])
 
     def predict(self, example):
         '''
         Classify a new example.
         '''
-        dec = self.model.decision_function([example])[0]
-        prob = 1 / (1 + math.exp(dec * -1))
-        return prob
+        return float(self.predict_batch([example])[0])
 
+    def predict_batch(self, examples):
+        '''
+        Classify a matrix of new examples, one example per row.
+        '''
+        dec = self.decision_function(examples)
+        probs = 1 / (1 + np.exp(dec * -1))
+        return probs
 
-class NeuralNet(BaseModel):
-    def __init__(self, train=False):
+    def decision_function(self, examples):
+        '''
+        Get the signed distance of each example to the separating
+        hyperplane, a single dot product for a linear model.
+        '''
+        if self.coef is None:
+            return self.model.decision_function(examples)
+        dec = np.dot(np.asarray(examples, dtype=float), self.coef)
+        return dec + self.intercept
+
+    def upper_bounds(self, examples, columns, lows, highs):
+        '''
+        Get an upper bound on the probability of each example, for any
+        values of the given feature columns within the given ranges. For a
+        linear model the bound is exact: each feature takes the end of its
+        range that maximizes the decision function.
+        '''
+        if self.coef is None:
+            return None
+
+        examples = np.array(examples, dtype=float)
+        examples[:, columns] = 0
+        dec = self.decision_function(examples)
+
+        coef = self.coef[columns]
+        dec += np.maximum(coef * lows, coef * highs).sum()
+        return 1 / (1 + np.exp(dec * -1))
+
+
+class KerasModel(BaseModel):
+    '''
+    Neural net trained with Keras. For prediction, the network is run with
+    NumPy if it has been exported, so TensorFlow isn't needed.
+    '''
+    model_file = None
+    numpy_file = None
+
+    @classmethod
+    def is_fork_safe(cls):
+        '''
+        TensorFlow sessions don't survive a fork, so only exported networks
+        can be loaded before forking.
+        '''
+        return os.path.isfile(cls.numpy_file)
+
+    def load_model(self, keras=False):
+        '''
+        Load the exported network, or the Keras model if it hasn't been
+        exported or if keras is True.
+        '''
+        if not keras and os.path.isfile(self.numpy_file):
+            return inference.NumpyModel(self.numpy_file)
+
+        from keras.models import load_model
+        return load_model(self.model_file)
+
+    def export(self):
+        '''
+        Export the Keras model for prediction with NumPy and compare the
+        predictions of both on random examples.
+        '''
+        print('Exporting model: {}'.format(self.numpy_file))
+        inference.export(self.model_file, self.numpy_file)
+
+        from keras.models import load_model
+        keras_model = load_model(self.model_file)
+        numpy_model = inference.NumpyModel(self.numpy_file)
+
+        examples = np.random.rand(1000, len(self.features))
+        self.model = keras_model
+        keras_probs = self.predict_batch(examples)
+        self.model = numpy_model
+        numpy_probs = self.predict_batch(examples)
+
+        print('Max. difference: {}'.format(
+            np.abs(keras_probs - numpy_probs).max()))
+
+
+class NeuralNet(KerasModel):
+    model_file = model_file_template.format('nn.h5')
+    numpy_file = model_file_template.format('nn.npz')
+
+    def __init__(self, train=False, keras=False):
         self.features = self.load_features('nn.json')
-        self.model_file = model_file_template.format('nn.h5')
 
         if train:
             self.load_csv()
             self.model = self.create_model()
         else:
-            self.model = load_model(self.model_file)
+            self.model = self.load_model(keras)
+
+        # Dense layers used for upper bounds, False until retrieved and None
+        # if the network has layers of other types
+        self.dense_layers = False
 
     def load_csv(self):
         '''
         Transform tabular data set into NumPy arrays.
         '''
+        import pandas as pd
+
         print('Loading training set: {}'.format(training_file))
         df = pd.read_csv(training_file, sep='\t')
 
@@ -173,6 +338,11 @@ class NeuralNet(BaseModel):
         '''
         Create new keras model.
         '''
+        from keras.constraints import maxnorm
+        from keras.layers import Dense
+        from keras.layers import Dropout
+        from keras.models import Sequential
+
         self.class_weight = {0: 0.25, 1: 0.75}
 
         model = Sequential()
@@ -191,14 +361,22 @@ class NeuralNet(BaseModel):
         print('Training new model: {}()'.format(self.__class__.__name__))
         self.model.fit(self.data, self.labels, epochs=100, batch_size=128,
                        class_weight=self.class_weight)
+        self.dense_layers = False
 
         print('Saving model: {}'.format(self.model_file))
         self.model.save(self.model_file)
+        self.export()
 
     def validate(self):
         '''
         Ten-fold cross-validation with stratified sampling.
         '''
+        from sklearn.metrics import accuracy_score
+        from sklearn.metrics import f1_score
+        from sklearn.metrics import precision_score
+        from sklearn.metrics import recall_score
+        from sklearn.model_selection import StratifiedShuffleSplit
+
         print('Validating new model: {}()'.format(self.__class__.__name__))
 
         accuracy_scores = []
@@ -231,13 +409,70 @@ class NeuralNet(BaseModel):
         '''
         Classify a new example.
         '''
-        example = np.array([example], dtype=np.float32)
-        prob = self.model.predict(example, batch_size=1)
-        return float(prob[0][0])
+        return float(self.predict_batch([example])[0])
+
+    def predict_batch(self, examples):
+        '''
+        Classify a matrix of new examples, one example per row.
+        '''
+        examples = np.array(examples, dtype=np.float32)
+        probs = self.model.predict(examples, batch_size=examples.shape[0])
+        return probs[:, 0]
+
+    def upper_bounds(self, examples, columns, lows, highs):
+        '''
+        Get an upper bound on the probability of each example, for any
+        values of the given feature columns within the given ranges, by
+        propagating the value intervals through the network layers.
+        '''
+        if self.dense_layers is False:
+            self.dense_layers = self.get_dense_layers()
+        if self.dense_layers is None:
+            return None
+
+        lower = np.array(examples, dtype=float)
+        upper = lower.copy()
+        lower[:, columns] = lows
+        upper[:, columns] = highs
+
+        for weights, bias, activation in self.dense_layers:
+            center = ((lower + upper) / 2).dot(weights) + bias
+            radius = ((upper - lower) / 2).dot(np.abs(weights))
+            lower = activation(center - radius)
+            upper = activation(center + radius)
+
+        return upper[:, 0]
+
+    def get_dense_layers(self):
+        '''
+        Get the weights, bias and activation function of each dense layer,
+        or None if the network has layers of other types.
+        '''
+        layers = []
+        for layer in self.model.layers:
+            # Dropout layers don't change values at prediction time
+            if layer.__class__.__name__ in ['InputLayer', 'Dropout']:
+                continue
+            if layer.__class__.__name__ != 'Dense':
+                return None
+
+            activation = inference.activations.get(
+                layer.get_config()['activation'])
+            if not activation:
+                return None
+
+            weights, bias = layer.get_weights()
+            layers.append((weights.astype(float), bias.astype(float),
+                           activation))
+
+        return layers
 
 
-class BranchingNeuralNet(BaseModel):
-    def __init__(self, train=False):
+class BranchingNeuralNet(KerasModel):
+    model_file = model_file_template.format('bnn.h5')
+    numpy_file = model_file_template.format('bnn.npz')
+
+    def __init__(self, train=False, keras=False):
         self.features = self.load_features('bnn.json')
 
         self.entity_features = [f for f in self.features if
@@ -251,18 +486,18 @@ class BranchingNeuralNet(BaseModel):
         self.m_start = (len(self.entity_features) +
                         len(self.candidate_features))
 
-        self.model_file = model_file_template.format('bnn.h5')
-
         if train:
             self.load_csv()
             self.model = self.create_model()
         else:
-            self.model = load_model(self.model_file)
+            self.model = self.load_model(keras)
 
     def load_csv(self):
         '''
         Transform tabular data set into NumPy arrays.
         '''
+        import pandas as pd
+
         print('Loading training set: {}'.format(training_file))
         df = pd.read_csv(training_file, sep='\t')
 
@@ -281,6 +516,13 @@ class BranchingNeuralNet(BaseModel):
         '''
         Create new keras model.
         '''
+        from keras.constraints import maxnorm
+        from keras.layers import concatenate
+        from keras.layers import Dense
+        from keras.layers import Dropout
+        from keras.layers import Input
+        from keras.models import Model
+
         self.class_weight = {0: 0.25, 1: 0.75}
 
         # Entity branch
@@ -340,11 +582,18 @@ class BranchingNeuralNet(BaseModel):
 
         print('Saving model: {}'.format(self.model_file))
         self.model.save(self.model_file)
+        self.export()
 
     def validate(self):
         '''
         Ten-fold cross-validation with stratified sampling.
         '''
+        from sklearn.metrics import accuracy_score
+        from sklearn.metrics import f1_score
+        from sklearn.metrics import precision_score
+        from sklearn.metrics import recall_score
+        from sklearn.model_selection import StratifiedShuffleSplit
+
         print('Validating new model: {}()'.format(self.__class__.__name__))
 
         accuracy_scores = []
@@ -387,16 +636,102 @@ class BranchingNeuralNet(BaseModel):
         '''
         Classify a new example.
         '''
+        return float(self.predict_batch([example])[0])
+
+    def predict_batch(self, examples):
+        '''
+        Classify a matrix of new examples, one example per row.
+        '''
+        examples = np.array(examples, dtype=np.float32)
+
         example_list = []
-        example_list.append(np.array([example[:self.c_start]],
-                                     dtype=np.float32))
-        example_list.append(np.array([example[self.c_start:self.m_start]],
-                                     dtype=np.float32))
-        example_list.append(np.array([example[self.m_start:]],
-                                     dtype=np.float32))
+        example_list.append(examples[:, :self.c_start])
+        example_list.append(examples[:, self.c_start:self.m_start])
+        example_list.append(examples[:, self.m_start:])
 
-        prob = self.model.predict(example_list, batch_size=1)
-        return float(prob[0][0])
+        probs = self.model.predict(example_list,
+                                   batch_size=examples.shape[0])
+        return probs[:, 0]
+
+
+# Model classes, by model name
+model_classes = {
+    'train': BaseModel,
+    'svm': LinearSVM,
+    'nn': NeuralNet,
+    'bnn': BranchingNeuralNet
+}
+
+
+class ModelRegistry(object):
+    '''
+    Models shared by all requests of a process, loaded once, either in
+    advance or when first needed. Each model can be warmed up with an
+    inference on an empty example, so the first request doesn't pay for
+    finalizing the model.
+    '''
+
+    def __init__(self, names=None, default='nn', warm_up=True):
+        '''
+        Initialize the registry, restricted to the given model names if
+        specified.
+        '''
+        self.names = [n for n in (names or sorted(model_classes)) if n in
+                      model_classes]
+        self.default = default if default in self.names else self.names[0]
+        self.warm_up = warm_up
+
+        self.models = {}
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def get(self, name=None):
+        '''
+        Get the model with the given name, or the default model if no name
+        is given, loading it if necessary. Raises a KeyError for unknown or
+        disabled models.
+        '''
+        name = name or self.default
+        if name not in self.names:
+            raise KeyError('Unknown model: {}'.format(name))
+
+        with self.lock:
+            self.check_pid()
+            if name not in self.models:
+                self.models[name] = self.load(name)
+            return self.models[name]
+
+    def load(self, name):
+        '''
+        Load a model and warm it up if required.
+        '''
+        model = model_classes[name]()
+        if self.warm_up and name != 'train':
+            model.predict_batch(np.zeros((1, len(model.features))))
+        return model
+
+    def preload(self, fork_safe=False):
+        '''
+        Load all models in advance. If fork_safe is True, only load the
+        models that can be shared with forked processes, and collect
+        garbage afterwards so the shared memory pages are left untouched
+        by the workers as much as possible.
+        '''
+        for name in self.names:
+            if not fork_safe or model_classes[name].is_fork_safe():
+                self.get(name)
+        if fork_safe:
+            gc.collect()
+
+    def check_pid(self):
+        '''
+        Forget models that can't be used after a fork, if the registry was
+        inherited from another process.
+        '''
+        if self.pid != os.getpid():
+            self.models = {n: m for n, m in self.models.items() if
+                           m.is_fork_safe()}
+            self.pid = os.getpid()
 
 
 if __name__ == '__main__':
@@ -408,6 +743,9 @@ if __name__ == '__main__':
                         help='train and save new model')
     parser.add_argument('-v', '--validate', required=False,
                         action='store_true', help='cross-validate new model')
+    parser.add_argument('-x', '--export', required=False,
+                        action='store_true',
+                        help='export current model for prediction with NumPy')
     parser.add_argument('-m', '--model', required=False, type=str,
                         default='svm', help='model type')
 
@@ -416,6 +754,14 @@ if __name__ == '__main__':
     if vars(args)['weights']:
         LinearSVM().weights()
 
+    elif vars(args)['export']:
+        if vars(args)['model'] == 'svm':
+            LinearSVM(sklearn=True).export()
+        elif vars(args)['model'] == 'nn':
+            NeuralNet(keras=True).export()
+        elif vars(args)['model'] == 'bnn':
+            BranchingNeuralNet(keras=True).export()
+
     else:
         if vars(args)['model'] == 'svm':
             model = LinearSVM(train=True)
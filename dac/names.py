@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import re
+
+# Some suffixes that shouldn't qualify as last names
+SUFFIXES = frozenset(['jr', 'sr', 'z', 'zn', 'fils'])
+
+# Prefixes added to last names
+PREFIXES = frozenset(['van', 'de', 'der', 'het', 'von'])
+
+# Roman numerals
+roman_pattern = re.compile(
+    '^M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$',
+    flags=re.IGNORECASE)
+
+# Spelling variants: sch(e) to s(e), trailing v to w and trailing w to v
+sch_pattern = re.compile(r'(^|\s)([a-zA-Z]{2,})sch(e?)')
+v_pattern = re.compile(r'(^|\s)([a-zA-Z]{2,})v($|\s)')
+w_pattern = re.compile(r'(^|\s)([a-zA-Z]{2,})w($|\s)')
+
+# Maximum number of results remembered per function
+NAME_CACHE_SIZE = 100000
+
+name_caches = []
+
+
+def memoize(func):
+    '''
+    Remember the results of a function of hashable arguments, until the
+    cache is full.
+    '''
+    results = {}
+    name_caches.append(results)
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return results[args]
+        except KeyError:
+            pass
+        result = func(*args)
+        if len(results) >= NAME_CACHE_SIZE:
+            results.clear()
+        results[args] = result
+        return result
+
+    return wrapper
+
+
+def clear_caches():
+    '''
+    Forget all remembered results.
+    '''
+    for results in name_caches:
+        results.clear()
+
+
+@memoize
+def normalize_ocr(s):
+    '''
+    Generate a common OCR error tolerant search string from an already
+    normalized string.
+    '''
+    if len(s) > 1:
+        first = s[0]
+
+        # Equate e, c and i, l (not as first character)
+        rest = s[1:].replace('c', 'e').replace('l', 'i')
+
+        # Equate G, C, O (only as first character)
+        if first == 'c' or first == 'o':
+            first = 'g'
+
+        # Equate B en E (only as first character)
+        if first == 'b':
+            first = 'e'
+
+        s = first + rest
+
+    return s
+
+
+@memoize
+def get_last_part(s, exclude_first_part=False):
+    '''
+    Extract probable last name from a string, excluding numbers, Roman
+    numerals and some well-known suffixes.
+    '''
+    parts = s.split()
+
+    # Position of the last part, the first part may be excluded
+    first = 1 if exclude_first_part else 0
+    last = None
+
+    for i in range(len(parts) - 1, first - 1, -1):
+        part = parts[i]
+        if part.isdigit():
+            continue
+        if part in SUFFIXES:
+            continue
+        if roman_pattern.match(part):
+            continue
+        last = i
+        break
+
+    if last is None:
+        return None
+
+    last_part = parts[last]
+
+    for i in range(last - 1, first - 1, -1):
+        if parts[i] in PREFIXES:
+            last_part = ' '.join([parts[i], last_part])
+
+    return last_part
+
+
+@memoize
+def get_substitutions(s):
+    '''
+    Get basic spelling variants of a string.
+    '''
+    subs = []
+
+    # Replace oo with o
+    if 'oo' in s:
+        subs.append(s.replace('oo', 'o'))
+
+    # Replace y with ij
+    if 'y' in s:
+        subs.append(s.replace('y', 'ij'))
+
+    # Replace ae with aa
+    if 'ae' in s:
+        subs.append(s.replace('ae', 'aa'))
+
+    # Remove trailing s
+    if s.endswith('s'):
+        subs.append(s[:-1])
+
+    # Replace sch(e) with s(e)
+    if sch_pattern.search(s):
+        subs.append(sch_pattern.sub(r'\1\2s\3', s))
+
+    # Replace trailing v with w
+    if v_pattern.search(s):
+        subs.append(v_pattern.sub(r'\1\2w\3', s))
+
+    # Replace trailing w with v
+    if w_pattern.search(s):
+        subs.append(w_pattern.sub(r'\1\2v\3', s))
+
+    return tuple(subs)
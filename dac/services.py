@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default settings, used if not specified in the configuration
+DEFAULTS = {
+    'HTTP_POOL_SIZE': 10,
+    'HTTP_TIMEOUT': 300,
+    'JSRU_TIMEOUT': 30
+}
+
+
+class ServiceClient(object):
+    '''
+    HTTP client with a pool of persistent connections for each of the
+    external services (TPTA, JSRU, TOPICS, SOLR, W2V).
+    '''
+
+    def __init__(self, conf):
+        '''
+        Initialize the client with the service configuration.
+        '''
+        self.conf = conf
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_setting(self, service, setting):
+        '''
+        Get a service setting, e.g. SOLR_TIMEOUT, falling back on the general
+        HTTP setting, e.g. HTTP_TIMEOUT.
+        '''
+        key = '{}_{}'.format(service, setting)
+        if self.conf.get(key) is not None:
+            return self.conf.get(key)
+        if key in DEFAULTS:
+            return DEFAULTS[key]
+
+        key = 'HTTP_{}'.format(setting)
+        if self.conf.get(key) is not None:
+            return self.conf.get(key)
+        return DEFAULTS[key]
+
+    def get_session(self, service):
+        '''
+        Get the session for a service. Sessions are not shared between
+        processes, so forked workers each create their own.
+        '''
+        key = (service, os.getpid())
+        with self.lock:
+            if key not in self.sessions:
+                pool_size = self.get_setting(service, 'POOL_SIZE')
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[key] = session
+            return self.sessions[key]
+
+    def get(self, service, url, params=None, timeout=None):
+        '''
+        Send a GET request to a service, using the configured timeout unless
+        specified otherwise.
+        '''
+        if timeout is None:
+            timeout = self.get_setting(service, 'TIMEOUT')
+
+        session = self.get_session(service)
+        return session.get(url, params=params, timeout=timeout)
@@ -157,6 +157,69 @@ def validate(model, version, test_file):
     print '---'
 
 
+def validate_staged(model, test_file):
+    '''
+    Compare accuracy and latency of the DAC Entity Linker in regular and
+    staged mode, based on a labeled test set created with the DAC web
+    interface.
+    '''
+    with open(test_file) as fh:
+        data = json.load(fh)
+
+    linkers = [dac.EntityLinker(model=model, debug=True),
+               dac.EntityLinker(model=model, debug=True, staged=True)]
+
+    nr_instances = 0
+    nr_agreements = 0
+    nr_correct_instances = [0, 0]
+    durations = [0.0, 0.0]
+
+    for i in data['instances']:
+
+        # Check if instance has been properly labeled
+        if not i['links']:
+            continue
+
+        ne = i['ne_string'].encode('utf-8')
+        print('Evaluating instance {}: {}'.format(nr_instances, ne))
+
+        # Alternate the order of the modes, as the second one may profit
+        # from cached service responses
+        order = [0, 1] if nr_instances % 2 == 0 else [1, 0]
+
+        predictions = [None, None]
+        for mode in order:
+            start = time.time()
+            try:
+                result = linkers[mode].link(i['url'], ne)
+                result = result['linkedNEs'][0]
+            except Exception as e:
+                print(e)
+                result = {}
+            durations[mode] += time.time() - start
+
+            predictions[mode] = result.get('link', 'none')
+            if predictions[mode] in i['links']:
+                nr_correct_instances[mode] += 1
+
+        if predictions[0] == predictions[1]:
+            nr_agreements += 1
+
+        nr_instances += 1
+
+    print '---'
+    print 'Number of instances: ' + str(nr_instances)
+    print 'Number of identical predictions: ' + str(nr_agreements)
+    print '---'
+    for mode, name in enumerate(['Regular', 'Staged']):
+        print name + ' prediction accuracy: ' + str(
+            nr_correct_instances[mode] / float(nr_instances))
+        print name + ' mean latency (s): ' + str(
+            durations[mode] / nr_instances)
+    print 'Speedup: ' + str(durations[0] / durations[1])
+    print '---'
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
@@ -167,7 +230,14 @@ if __name__ == '__main__':
     parser.add_argument('-i', '--input', required=False, type=str,
                         default='../../../dac-web/users/test-clean/art.json',
                         help='path to test set')
+    parser.add_argument('-s', '--staged', required=False,
+                        action='store_true',
+                        help='compare regular and staged mode')
 
     args = parser.parse_args()
 
-    validate(vars(args)['model'], vars(args)['version'], vars(args)['input'])
+    if vars(args)['staged']:
+        validate_staged(vars(args)['model'], vars(args)['input'])
+    else:
+        validate(vars(args)['model'], vars(args)['version'],
+                 vars(args)['input'])
@@ -20,6 +20,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import string
+from bisect import bisect_left
 from segtok.segmenter import split_multi
 from segtok.tokenizer import word_tokenizer
 from unidecode import unidecode
@@ -34,12 +36,29 @@ NORM_CHARS = ['.', ',', ':', '?', '!', ';', '-', '/', '|', '&']
 
 norm_rx = '[' + re.escape(''.join(NORM_CHARS)) + ']'
 
+clean_pattern = re.compile(clean_rx)
+norm_pattern = re.compile(norm_rx)
+
+# Translation table for the ASCII strings produced by unidecode, removing
+# capitalization and replacing regular punctuation by spaces in a single
+# pass. Control characters \x1c-\x1f count as whitespace in unicode strings,
+# so these are replaced by spaces as well.
+NORM_TABLE = string.maketrans(
+    string.ascii_uppercase + ''.join(NORM_CHARS) + '\x1c\x1d\x1e\x1f',
+    string.ascii_lowercase + ' ' * (len(NORM_CHARS) + 4))
+NORM_DELETE = ''.join(CLEAN_CHARS)
+
+# Maximum number of normalized strings remembered
+NORM_CACHE_SIZE = 100000
+
+norm_cache = {}
+
 
 def clean(s):
     '''
     Clean string by removing unwanted characters.
     '''
-    s = re.sub(clean_rx, u'', s)
+    s = clean_pattern.sub(u'', s)
     s = u' '.join(s.split())
     return s
 
@@ -48,83 +67,33 @@ def normalize(s):
     '''
     Normalize string by removing punctuation, capitalization, diacritics.
     '''
+    try:
+        return norm_cache[s]
+    except KeyError:
+        pass
+
     # Replace diactritics
-    s = unidecode(s)
-    # Remove unwanted characters
-    s = clean(s)
-    # Remove capitalization
-    s = s.lower()
-    # Replace regular punctuation by spaces
-    s = re.sub(norm_rx, u' ', s)
-    s = u' '.join(s.split())
+    norm = unidecode(s)
+    if isinstance(norm, str):
+        # Remove unwanted characters and capitalization, replace regular
+        # punctuation by spaces
+        norm = norm.translate(NORM_TABLE, NORM_DELETE)
+        norm = u' '.join(norm.split())
+    else:
+        norm = clean(norm)
+        norm = norm.lower()
+        norm = norm_pattern.sub(u' ', norm)
+        norm = u' '.join(norm.split())
     # Remove double consonants
-    if len(s) >= 2 and s[-1] == s[-2]:
-        s = s[:-1]
-    return s
-
-
-def normalize_ocr(s):
-    '''
-    Generate a common OCR error tolerant search string from an already
-    normalized string.
-    '''
-    if len(s) > 1:
-        # Equate e, c (not as first character)
-        s = ''.join([s[0], s[1:].replace('c', 'e')])
-
-        # Equate i, l (not as first character)
-        s = ''.join([s[0], s[1:].replace('l', 'i')])
-
-        # Equate G, C, O (only as first character)
-        if s[0] == 'c' or s[0] == 'o':
-            s = ''.join(['g', s[1:]])
-
-        # Equate B en E (only as first character)
-        if s[0] == 'b':
-            s = ''.join(['e', s[1:]])
-
-    return s
-
-
-def get_last_part(s, exclude_first_part=False):
-    '''
-    Extract probable last name from a string, excluding numbers, Roman
-    numerals and some well-known suffixes.
-    '''
-    last_part = None
-
-    # Some suffixes that shouldn't qualify as last names
-    suffixes = ['jr', 'sr', 'z', 'zn', 'fils']
-
-    # Regex to match Roman numerals
-    pattern = '^M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$'
-
-    parts = s.split()
+    if len(norm) >= 2 and norm[-1] == norm[-2]:
+        norm = norm[:-1]
 
-    for part in reversed(parts):
-        if exclude_first_part:
-            if parts.index(part) == 0:
-                break
-        if part.isdigit():
-            continue
-        if part in suffixes:
-            continue
-        if re.match(pattern, part, flags=re.IGNORECASE):
-            continue
-        last_part = part
-        break
+    # Tokens repeat often, so keep the results until the cache is full
+    if len(norm_cache) >= NORM_CACHE_SIZE:
+        norm_cache.clear()
+    norm_cache[s] = norm
 
-    prefixes = ['van', 'de', 'der', 'het', 'von']
-
-    if last_part:
-        for part in reversed(parts[:parts.index(last_part)]):
-            if exclude_first_part:
-                if parts.index(part) == 0:
-                    break
-            if part in prefixes:
-                last_part = ' '.join([part, last_part])
-
-    return last_part
+    return norm
 
 
 def segment(text):
@@ -159,3 +128,96 @@ def tokenize(text, segment=True, norm=True, unique=False, min_len=2,
                   normalize(t).split()]
 
     return tokens
+
+
+class TokenIndex(object):
+    '''
+    Normalized tokens of a text with the character offsets of the tokens
+    they were derived from, so the tokens of any part of the text can be
+    retrieved without tokenizing it again.
+    '''
+
+    def __init__(self, text, min_len=2):
+        '''
+        Tokenize text using SegTok segmenter and tokenizer, keeping the
+        offset of each token.
+        '''
+        self.text = text
+        self.min_len = min_len
+
+        # Start and end offsets of the tokens and their normalized words
+        self.starts = []
+        self.ends = []
+        self.words = []
+
+        pos = 0
+        for s in split_multi(text):
+            for t in word_tokenizer(s):
+                start = text.find(t, pos)
+                if start > -1:
+                    pos = start + len(t)
+                else:
+                    # Token not found verbatim, keep the current position
+                    start = pos
+                if len(t) < min_len:
+                    continue
+                self.starts.append(start)
+                self.ends.append(pos)
+                self.words.append(normalize(t).split())
+
+        self.tokens = [w for words in self.words for w in words]
+
+    def span(self, start, end):
+        '''
+        Get the normalized tokens of the text between the start and end
+        offsets. Tokens cut off at either end are tokenized again for the
+        part inside the span.
+        '''
+        if start >= end:
+            return []
+
+        first = bisect_left(self.starts, start)
+        last = bisect_left(self.starts, end)
+
+        tokens = []
+
+        # Token starting before the span
+        if first > 0 and self.ends[first - 1] > start:
+            tokens += tokenize(self.text[start:min(self.ends[first - 1],
+                                                   end)], segment=False,
+                               min_len=self.min_len)
+
+        # Token ending after the span
+        tail = []
+        if last > first and self.ends[last - 1] > end:
+            last -= 1
+            tail = tokenize(self.text[self.starts[last]:end], segment=False,
+                            min_len=self.min_len)
+
+        for words in self.words[first:last]:
+            tokens += words
+
+        return tokens + tail
+
+    def window(self, s):
+        '''
+        Get the normalized tokens of a part of the text. If the part does
+        not occur in the text, it is tokenized by itself.
+
+        The first occurrence of the part is used. A part occurring more than
+        once gets the same tokens at each occurrence, except where these
+        depend on the surrounding text. The tokens equal those of
+        tokenize(s, segment=False) for parts starting and ending at word
+        boundaries, except around periods: the text is split into sentences
+        first, so a one-letter word followed by a period, e.g. an initial,
+        is left out as too short, while tokenizing the part by itself keeps
+        the period and with it the word.
+        '''
+        if not s:
+            return []
+
+        start = self.text.find(s)
+        if start == -1:
+            return tokenize(s, segment=False, min_len=self.min_len)
+
+        return self.span(start, start + len(s))
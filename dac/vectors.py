@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import base64
+import io
+import json
+import os
+
+import numpy as np
+
+import cache
+
+abs_path = os.path.dirname(os.path.realpath(__file__))
+
+# Number of vectors copied at a time when converting a word2vec file
+CHUNK_SIZE = 10000
+
+# Marker for words not found in the cache, as opposed to words without a
+# vector, which are cached as empty lists
+MISSING = object()
+
+
+class RemoteVectors(object):
+    '''
+    Word vectors retrieved from the word2vec service, cached per word in
+    memory and optionally on disk.
+    '''
+
+    def __init__(self, url, client, size=100000, disk_cache=None,
+                 get_executor=None):
+        '''
+        Initialize the in-memory cache, holding at most size words. If
+        get_executor is given, it is called to get the thread pool used to
+        send requests concurrently.
+        '''
+        self.url = url
+        self.client = client
+        self.memory_cache = cache.LRUCache(size)
+        self.disk_cache = disk_cache
+        self.get_executor = get_executor
+
+    def get_vectors(self, words):
+        '''
+        Get the vectors for a list of words, skipping words without a
+        vector. Only words not found in the cache are requested.
+        '''
+        found = {}
+        missing = []
+        for word in words:
+            if word not in found:
+                found[word] = self.get_cached(word)
+                if found[word] is MISSING:
+                    missing.append(word)
+
+        if missing:
+            vectors = self.request_missing(missing)
+            for word in missing:
+                found[word] = vectors[word]
+                self.set_cached(word, vectors[word])
+
+        return [found[w] for w in words if found[w]]
+
+    def request_missing(self, words):
+        '''
+        Request the vectors for a list of words, using an empty list for
+        words without a vector. If the vectors in a response can't be
+        matched to the words, the words are split in halves that are
+        requested again, all halves of the same round at once.
+        '''
+        vectors = {}
+        chunks = [words]
+        responses = [self.request_vectors(words)]
+
+        while chunks:
+            unmatched = []
+            for chunk, data in zip(chunks, responses):
+                matched = self.match_vectors(chunk, data)
+                if matched is None:
+                    half = len(chunk) // 2
+                    unmatched += [chunk[:half], chunk[half:]]
+                else:
+                    vectors.update(matched)
+
+            chunks = unmatched
+            if self.get_executor and len(chunks) > 1:
+                executor = self.get_executor()
+                responses = list(executor.map(self.request_vectors, chunks))
+            else:
+                responses = [self.request_vectors(c) for c in chunks]
+
+        return vectors
+
+    def get_cached(self, word):
+        '''
+        Get the vector for a word from the cache, or MISSING if not found.
+        '''
+        vector = self.memory_cache.get(word, MISSING)
+        if vector is MISSING and self.disk_cache:
+            vector = self.disk_cache.get(word)
+            if vector is None:
+                vector = MISSING
+            else:
+                self.memory_cache.set(word, vector)
+        return vector
+
+    def set_cached(self, word, vector):
+        '''
+        Store the vector for a word in the cache.
+        '''
+        self.memory_cache.set(word, vector)
+        if self.disk_cache:
+            self.disk_cache.set(word, vector)
+
+    def request_vectors(self, words):
+        '''
+        Request the vectors for a list of words from the service.
+        '''
+        payload = {'source': ' '.join(words)}
+        response = self.client.get('W2V', self.url, params=payload)
+
+        if response.status_code != 200:
+            raise IOError('Error retrieving word vectors from: {}'.format(
+                self.url))
+
+        return response.json()
+
+    def match_vectors(self, words, data):
+        '''
+        Match the vectors in a service response to the requested words,
+        using an empty list for words without a vector. Return None if the
+        vectors cannot be matched.
+        '''
+        if 'words' in data:
+            vectors = dict(zip(data['words'], data['vectors']))
+            return {w: vectors.get(w, []) for w in words}
+
+        if not data['vectors']:
+            return {w: [] for w in words}
+        if len(words) == 1:
+            return {words[0]: data['vectors'][0]}
+
+        # Without a word list, as returned by the word2vec service, vectors
+        # can only be matched to the words if all words were found
+        if len(data['vectors']) == len(words):
+            return dict(zip(words, data['vectors']))
+
+        return None
+
+
+class LocalVectors(object):
+    '''
+    Word vectors read from a local store, consisting of a vocabulary of
+    sorted utf-8 encoded words (path.vocab.npy) and a matrix with the
+    corresponding vectors (path.vectors.npy). Both are memory-mapped, so
+    processes share a single copy.
+    '''
+
+    def __init__(self, path):
+        '''
+        Open the vector store. Relative paths are taken relative to the dac
+        directory.
+        '''
+        self.path = os.path.join(abs_path, path)
+        self.vocab = np.load(self.path + '.vocab.npy', mmap_mode='r')
+        self.matrix = np.load(self.path + '.vectors.npy', mmap_mode='r')
+
+    def get_vectors(self, words):
+        '''
+        Get the vectors for a list of words, skipping words without a
+        vector.
+        '''
+        if not words or not len(self.vocab):
+            return []
+
+        keys = np.array([encode(w) for w in words], dtype=bytes)
+        indices = np.searchsorted(self.vocab, keys)
+        indices[indices == len(self.vocab)] = 0
+        indices = indices[self.vocab[indices] == keys]
+
+        return self.matrix[indices].tolist()
+
+
+class DocumentVectors(object):
+    '''
+    Vectors stored in Solr documents, decoded once per document and kept
+    in memory for the most recently used documents. Each cached field
+    takes four bytes per vector dimension, e.g. 4 KB for an abstract of ten
+    100-dimensional sentence vectors.
+    '''
+
+    def __init__(self, size=64 * 1024 * 1024):
+        '''
+        Initialize the in-memory cache, holding at most size bytes of
+        vectors.
+        '''
+        self.memory_cache = cache.LRUCache(size, weight=lambda v: v.nbytes)
+
+    def get_vectors(self, document, field):
+        '''
+        Get the vectors stored in a document field as a float32 matrix,
+        with one row per vector, or None if the field is missing.
+        '''
+        if field not in document:
+            return None
+
+        key = (document.get('id'), field)
+        if key[0] is not None:
+            vectors = self.memory_cache.get(key)
+            if vectors is not None:
+                return vectors
+
+        values = document[field]
+        if isinstance(values, basestring):
+            values = [values]
+
+        vectors = np.vstack([decode(v) for v in values])
+        vectors.setflags(write=False)
+
+        if key[0] is not None:
+            self.memory_cache.set(key, vectors)
+
+        return vectors
+
+
+def cosine_similarity(x, y):
+    '''
+    Get the cosine similarity of each row of x with each row of y, as
+    computed by scikit-learn. Rows without length have a similarity of 0.
+    '''
+    x = normalize(x)
+    y = normalize(y)
+    return x.dot(y.T)
+
+
+def normalize(x):
+    '''
+    Scale the rows of a matrix to unit length, leaving rows without length
+    unchanged.
+    '''
+    x = np.asarray(x, dtype=float)
+    norms = np.sqrt((x * x).sum(axis=1))
+    norms[norms == 0] = 1
+    return x / norms[:, np.newaxis]
+
+
+def decode(value):
+    '''
+    Decode a vector stored as a JSON list or as base64 encoded little-endian
+    float32 values.
+    '''
+    if isinstance(value, basestring):
+        value = value.strip()
+        if not value.startswith('['):
+            return np.frombuffer(base64.b64decode(value), dtype='<f4')
+        value = json.loads(value)
+    return np.array(value, dtype=np.float32)
+
+
+def encode(word):
+    '''
+    Encode a word as utf-8.
+    '''
+    return word.encode('utf-8') if isinstance(word, unicode) else word
+
+
+def read_word2vec(path, binary=False):
+    '''
+    Read a word2vec text or binary file, yielding the number of words and
+    dimensions first and then each word with its vector.
+    '''
+    with io.open(path, 'rb') as f:
+        count, dim = [int(v) for v in f.readline().split()]
+        yield count, dim
+
+        for i in range(count):
+            if binary:
+                word = b''
+                while True:
+                    c = f.read(1)
+                    if c == b' ' or not c:
+                        break
+                    if c != b'\n':
+                        word += c
+                vector = np.frombuffer(f.read(4 * dim), dtype='<f4')
+            else:
+                parts = f.readline().rstrip().split(b' ')
+                word = parts[0]
+                vector = np.array(parts[1:], dtype=np.float32)
+            yield word, vector
+
+
+def convert(word2vec_path, path, binary=False, chunk_size=CHUNK_SIZE):
+    '''
+    Convert a word2vec text or binary file to a local vector store. The
+    vectors are written to disk in file order first and then copied to the
+    store in vocabulary order, chunk_size vectors at a time, so the whole
+    matrix is never held in memory.
+    '''
+    entries = read_word2vec(word2vec_path, binary)
+    count, dim = next(entries)
+
+    words = []
+    unsorted = np.lib.format.open_memmap(path + '.unsorted.npy', mode='w+',
+                                         dtype=np.float32,
+                                         shape=(count, dim))
+    for i, (word, vector) in enumerate(entries):
+        words.append(word)
+        unsorted[i] = vector
+
+    # Keep the first vector for words occurring more than once
+    vocab, indices = np.unique(np.array(words, dtype=bytes),
+                               return_index=True)
+    del words
+
+    np.save(path + '.vocab.npy', vocab)
+    matrix = np.lib.format.open_memmap(path + '.vectors.npy', mode='w+',
+                                       dtype=np.float32,
+                                       shape=(len(vocab), dim))
+    for start in range(0, len(vocab), chunk_size):
+        end = start + chunk_size
+        matrix[start:end] = unsorted[indices[start:end]]
+    matrix.flush()
+
+    del unsorted
+    os.remove(path + '.unsorted.npy')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('input', type=str, help='word2vec model file')
+    parser.add_argument('output', type=str,
+                        help='vector store path, without extension')
+    parser.add_argument('-b', '--binary', required=False,
+                        action='store_true', help='binary input file')
+
+    args = parser.parse_args()
+
+    convert(vars(args)['input'], vars(args)['output'],
+            binary=vars(args)['binary'])
@@ -38,11 +38,22 @@ from dac import models
 
 hostname = socket.gethostname()
 
-model_dict = {}
-model_dict['train'] = models.BaseModel()
-model_dict['svm'] = models.LinearSVM()
-model_dict['nn'] = models.NeuralNet()
-model_dict['bnn'] = models.BranchingNeuralNet()
+# Models available to the web service, restricted to MODELS if configured.
+# With MODEL_LOADING set to 'preload', models are loaded at startup. Models
+# that can be shared with forked workers are loaded in the uwsgi master
+# process, the others in each worker right after the fork. With 'lazy',
+# each worker loads a model when it is first requested.
+registry = models.ModelRegistry(dac.conf.get('MODELS'),
+                                warm_up=dac.conf.get('MODEL_WARM_UP', True))
+
+if dac.conf.get('MODEL_LOADING', 'preload') == 'preload':
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        registry.preload()
+    else:
+        registry.preload(fork_safe=True)
+        postfork(registry.preload)
 
 
 def array_to_utf(a):
@@ -84,8 +95,6 @@ def index():
     '''
     Return the entity linker result.
     '''
-    global model_dict
-
     url = request.params.get('url')
     ne = request.params.get('ne')
     model = request.params.get('model')
@@ -97,11 +106,13 @@ def index():
     if not url:
         abort(400, 'Missing argument ("url=...").')
 
-    if not model:
-        model = 'nn'
+    try:
+        model = registry.get(model)
+    except KeyError as e:
+        abort(400, e.args[0])
 
     try:
-        linker = dac.EntityLinker(model_dict.get(model), debug=debug,
+        linker = dac.EntityLinker(model, debug=debug,
                                   features=features, candidates=candidates)
         result = linker.link(url, ne)
     except Exception as e:
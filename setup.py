@@ -19,14 +19,15 @@ setup(
         ],
     packages=find_packages(where='.', exclude=['docs', 'tests']),
     install_requires=[
-        'bottle', 'h5py', 'Keras', 'lxml', 'numpy', 'pandas',
+        'bottle', 'futures', 'h5py', 'Keras', 'lxml', 'numpy', 'pandas',
         'python-Levenshtein', 'requests', 'scikit-learn', 'scipy', 'segtok',
         'tensorflow', 'Unidecode'
         ],
     package_data={'dac': [
         'config.json', 'features/bnn.json', 'features/features.json',
         'features/nn.json', 'features/svm.json', 'models/bnn.h5',
-        'models/nn.h5', 'models/svm.pkl'
+        'models/bnn.npz', 'models/nn.h5', 'models/nn.npz', 'models/svm.npz',
+        'models/svm.pkl'
         ]},
     data_files=None,
     entry_points={}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DAC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                        'dac')
+
+# Heavy libraries that should only be imported when needed
+HEAVY_MODULES = ['keras', 'tensorflow', 'sklearn', 'pandas', 'scipy']
+
+# Startup scenarios: code run after the import of dac
+SCENARIOS = [
+    ('import', ''),
+    ('train', 'dac.EntityLinker(model="train")'),
+    ('svm', 'dac.EntityLinker(model="svm")'),
+    ('nn', 'dac.EntityLinker(model="nn")'),
+    ('bnn', 'dac.EntityLinker(model="bnn")')
+]
+
+SCRIPT = '''
+import json
+import sys
+import time
+start = time.time()
+import dac
+{}
+elapsed = time.time() - start
+heavy = [m for m in {} if m in sys.modules]
+sys.stdout.write(json.dumps({{'time': elapsed, 'heavy': heavy}}))
+'''
+
+
+def measure(code, number=5):
+    '''
+    Run a scenario in a fresh interpreter a number of times, returning the
+    fastest startup time and the heavy modules imported.
+    '''
+    script = SCRIPT.format(code, HEAVY_MODULES)
+    times = []
+    for i in range(number):
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=DAC_PATH)
+        result = json.loads(output.decode('utf-8').splitlines()[-1])
+        times.append(result['time'])
+    return min(times), result['heavy']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-n', '--number', required=False, type=int,
+                        default=5, help='number of runs per scenario')
+
+    args = parser.parse_args()
+
+    for name, code in SCENARIOS:
+        elapsed, heavy = measure(code, vars(args)['number'])
+        print('{}: {:.3f}s, heavy modules: {}'.format(
+            name, elapsed, ', '.join(heavy) or 'none'))
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import io
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, '../dac')
+import names
+import utilities
+
+SAMPLE = [u'winston churchill', u'sir winston churchill', u'drees',
+          u'willem drees sr', u'willem iii', u'lodewijk xiv', u'karel v',
+          u'j h van kleffens', u'van der waals', u'de heer van dijk',
+          u'johan de witt', u'willem de zwijger', u'jan jan', u'fils',
+          u'koning willem ii 1849', u'sch', u'visscher', u'van gogh',
+          u'pieterszoon coen', u'jacob van ruysdael', u'huygens', u'de',
+          u'schoonhoven', u'mesdag', u'leeuw', u'ostrov', u'rembrandt zn']
+
+# Word parts used to generate random names
+PARTS = [u'van', u'de', u'der', u'het', u'von', u'jr', u'sr', u'z', u'zn',
+         u'fils', u'ii', u'iv', u'xiv', u'mcm', u'1848', u'jan', u'piet',
+         u'schouten', u'visscher', u'hoogh', u'ruysdael', u'de witt',
+         u'leeuw', u'ostrov', u'huygens', u'maes', u'coen', u'dyk', u'i']
+
+
+def reference_normalize_ocr(s):
+    '''
+    Generate an OCR error tolerant string as done before the name analysis
+    module was introduced.
+    '''
+    if len(s) > 1:
+        s = ''.join([s[0], s[1:].replace('c', 'e')])
+        s = ''.join([s[0], s[1:].replace('l', 'i')])
+        if s[0] == 'c' or s[0] == 'o':
+            s = ''.join(['g', s[1:]])
+        if s[0] == 'b':
+            s = ''.join(['e', s[1:]])
+    return s
+
+
+def reference_get_last_part(s, exclude_first_part=False):
+    '''
+    Extract the last name as done before the name analysis module was
+    introduced, with the positions of repeated words taken into account.
+    '''
+    last_part = None
+    suffixes = ['jr', 'sr', 'z', 'zn', 'fils']
+    pattern = '^M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$'
+
+    parts = s.split()
+    last = None
+
+    for i, part in reversed(list(enumerate(parts))):
+        if exclude_first_part and i == 0:
+            break
+        if part.isdigit():
+            continue
+        if part in suffixes:
+            continue
+        if re.match(pattern, part, flags=re.IGNORECASE):
+            continue
+        last_part = part
+        last = i
+        break
+
+    prefixes = ['van', 'de', 'der', 'het', 'von']
+
+    if last_part:
+        for i, part in reversed(list(enumerate(parts[:last]))):
+            if exclude_first_part and i == 0:
+                break
+            if part in prefixes:
+                last_part = ' '.join([part, last_part])
+
+    return last_part
+
+
+def reference_get_substitutions(s):
+    '''
+    Get spelling variants as done before the name analysis module was
+    introduced.
+    '''
+    subs = []
+    if s.find('oo') > -1:
+        subs.append(s.replace('oo', 'o'))
+    if s.find('y') > -1:
+        subs.append(s.replace('y', 'ij'))
+    if s.find('ae') > -1:
+        subs.append(s.replace('ae', 'aa'))
+    if s.endswith('s'):
+        subs.append(s[:-1])
+    for pattern, repl in [(r'(^|\s)([a-zA-Z]{2,})sch(e?)', r'\1\2s\3'),
+                          (r'(^|\s)([a-zA-Z]{2,})v($|\s)', r'\1\2w\3'),
+                          (r'(^|\s)([a-zA-Z]{2,})w($|\s)', r'\1\2v\3')]:
+        if re.search(pattern, s):
+            subs.append(re.sub(pattern, repl, s))
+    return tuple(subs)
+
+
+FUNCTIONS = [
+    ('normalize_ocr', reference_normalize_ocr, names.normalize_ocr),
+    ('get_last_part', reference_get_last_part, names.get_last_part),
+    ('get_last_part_excl', lambda s: reference_get_last_part(s, True),
+     lambda s: names.get_last_part(s, True)),
+    ('get_substitutions', reference_get_substitutions,
+     names.get_substitutions)
+]
+
+
+def get_corpus(path=None, size=10000):
+    '''
+    Get the normalized lines of a text file with one name per line, or the
+    sample names combined with random names. Names are repeated as they
+    would be in a collection.
+    '''
+    rand = random.Random(0)
+    if path:
+        with io.open(path, encoding='utf-8') as f:
+            corpus = [utilities.normalize(line) for line in f]
+    else:
+        corpus = SAMPLE + [u' '.join(rand.choice(PARTS) for j in
+                           range(rand.randint(1, 4))) for i in range(size)]
+    return [rand.choice(corpus) for i in range(len(corpus) * 5)]
+
+
+def check(corpus):
+    '''
+    Compare the output of the reference and new functions, returning the
+    differences.
+    '''
+    names.clear_caches()
+    diffs = []
+    for name, reference, func in FUNCTIONS:
+        diffs += [(name, s) for s in corpus if s and func(s) != reference(s)]
+    return diffs
+
+
+def bench(corpus, number=5):
+    '''
+    Time the reference and new functions on the corpus, with the caches
+    cleared before each run.
+    '''
+    def run(funcs):
+        names.clear_caches()
+        for s in corpus:
+            for func in funcs:
+                func(s)
+
+    corpus = [s for s in corpus if s]
+    times = {}
+    times['reference'] = timeit.timeit(
+        lambda: run([f[1] for f in FUNCTIONS]), number=number) / number
+    times['memoized'] = timeit.timeit(
+        lambda: run([f[2] for f in FUNCTIONS]), number=number) / number
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--input', required=False, type=str,
+                        help='utf-8 text file with one name per line')
+    parser.add_argument('-n', '--number', required=False, type=int,
+                        default=5, help='number of timed runs')
+
+    args = parser.parse_args()
+
+    corpus = get_corpus(vars(args)['input'])
+    diffs = check(corpus)
+
+    print('Number of names: ' + str(len(corpus)))
+    print('Number of unique names: ' + str(len(set(corpus))))
+    print('Number of differences: ' + str(len(diffs)))
+    for d in diffs[:10]:
+        print(repr(d))
+
+    times = bench(corpus, vars(args)['number'])
+    for name in ['reference', 'memoized']:
+        print('{}: {:.4f}s ({:.2f}x)'.format(name, times[name],
+              times['reference'] / times[name]))
+
+    sys.exit(1 if diffs else 0)
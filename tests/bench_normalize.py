@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DAC Entity Linker
+#
+# Copyright (C) 2017-2018 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import io
+import random
+import re
+import sys
+import timeit
+
+from unidecode import unidecode
+
+sys.path.insert(0, '../dac')
+import utilities
+
+SAMPLE = (u'Den Haag, 5 mei. — Minister-president Drees heeft gisteren in '
+          u'Londen gesproken met sir Winston Churchill (oud-premier) over '
+          u'„de toekomst” van Nederland & België. Prof. dr. J.H. van '
+          u'Kleffens [K.V.P.] zei: "Het is 100% zeker!" Café Ruïne, '
+          u'Zeeuwsch-Vlaanderen; f 1.25 per ¼ kg. Mevr. Ştefan-Müller '
+          u'antwoordde: ‚neen’ ... Ook Ørsted, Ærø en Łódź\x1cwerden '
+          u'genoemd, evenals #NS_spoor, <Philips> en {ANWB} ~ Stalinn')
+
+# Characters used to generate random test strings
+ALPHABET = (u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+            u'éëïöüçñßøæœ„”‚’«»—–…¼' + u''.join(utilities.CLEAN_CHARS) +
+            u''.join(utilities.NORM_CHARS) + u' \t\n\r\x0b\x0c\x1c\x1d\x1e'
+            u'\x1f\x85\xa0')
+
+
+def reference_clean(s):
+    '''
+    Clean string by removing unwanted characters.
+    '''
+    s = re.sub(utilities.clean_rx, u'', s)
+    s = u' '.join(s.split())
+    return s
+
+
+def reference_normalize(s):
+    '''
+    Normalize string as done before the translation table and cache were
+    introduced.
+    '''
+    s = unidecode(s)
+    s = reference_clean(s)
+    s = s.lower()
+    s = re.sub(utilities.norm_rx, u' ', s)
+    s = u' '.join(s.split())
+    if len(s) >= 2 and s[-1] == s[-2]:
+        s = s[:-1]
+    return s
+
+
+def get_corpus(path=None, size=10000):
+    '''
+    Get the tokens and lines of a text file, or of the sample text
+    combined with random strings.
+    '''
+    if path:
+        with io.open(path, encoding='utf-8') as f:
+            text = f.read()
+    else:
+        rand = random.Random(0)
+        text = u'\n'.join([SAMPLE] + [u''.join(rand.choice(ALPHABET)
+                          for j in range(rand.randint(1, 20)))
+                          for i in range(size)])
+
+    lines = text.splitlines()
+    tokens = [t for line in lines for t in line.split(u' ')]
+    return tokens + lines
+
+
+def check(corpus):
+    '''
+    Compare the output of both functions, returning the differences.
+    '''
+    utilities.norm_cache.clear()
+    return [s for s in corpus if utilities.normalize(s) !=
+            reference_normalize(s) or utilities.normalize(s) !=
+            reference_normalize(s)]
+
+
+def bench(corpus, number=5):
+    '''
+    Time both functions on the corpus, with and without cached results.
+    '''
+    def run(func):
+        for s in corpus:
+            func(s)
+
+    def run_uncached():
+        utilities.norm_cache.clear()
+        run(utilities.normalize)
+
+    times = {}
+    times['reference'] = timeit.timeit(lambda: run(reference_normalize),
+                                       number=number) / number
+    times['uncached'] = timeit.timeit(run_uncached, number=number) / number
+    run(utilities.normalize)
+    times['cached'] = timeit.timeit(lambda: run(utilities.normalize),
+                                    number=number) / number
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--input', required=False, type=str,
+                        help='utf-8 text file to use as corpus')
+    parser.add_argument('-n', '--number', required=False, type=int,
+                        default=5, help='number of timed runs')
+
+    args = parser.parse_args()
+
+    corpus = get_corpus(vars(args)['input'])
+    diffs = check(corpus)
+
+    print('Number of strings: ' + str(len(corpus)))
+    print('Number of differences: ' + str(len(diffs)))
+    for s in diffs[:10]:
+        print(repr(s))
+
+    times = bench(corpus, vars(args)['number'])
+    for name in ['reference', 'uncached', 'cached']:
+        print('{}: {:.4f}s ({:.2f}x)'.format(name, times[name],
+              times['reference'] / times[name]))
+
+    sys.exit(1 if diffs else 0)
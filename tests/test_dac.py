@@ -22,15 +22,27 @@
 import json
 import os
 import sys
+import threading
+import time
 
+import numpy as np
 import requests
 
 sys.path.insert(0, '../dac')
+import batch
+import cache
+import config
 import dac
+import dictionary
+import inference
+import names
+import services
+import utilities
 
 CONFIG_FILE = '../dac/config.json'
 NN_MODEL_FILE = '../dac/models/nn.h5'
 NN_FEATURE_FILE = '../dac/features/nn.json'
+NN_NUMPY_MODEL_FILE = '../dac/models/nn.npz'
 
 TEST_DOC = 'http://resolver.kb.nl/resolve?urn=ddd:010734861:mpeg21:a0002:ocr'
 
@@ -156,6 +168,324 @@ def w2v_is_working():
     '''
 
 
+def service_settings_are_working():
+    '''
+    >>> conf = {'SOLR_TIMEOUT': 60, 'HTTP_TIMEOUT': 120, 'JSRU_POOL_SIZE': 2}
+    >>> client = services.ServiceClient(conf)
+    >>> client.get_setting('SOLR', 'TIMEOUT')
+    60
+    >>> client.get_setting('JSRU', 'TIMEOUT')
+    30
+    >>> client.get_setting('TPTA', 'TIMEOUT')
+    120
+    >>> client.get_setting('JSRU', 'POOL_SIZE')
+    2
+    >>> client.get_setting('TPTA', 'POOL_SIZE')
+    10
+    >>> services.ServiceClient({'JSRU_TIMEOUT': 5}).get_setting('JSRU',
+    ...     'TIMEOUT')
+    5
+    '''
+
+
+def service_sessions_are_reused():
+    '''
+    >>> client = services.ServiceClient({})
+    >>> session = client.get_session('SOLR')
+    >>> client.get_session('SOLR') is session
+    True
+    >>> client.get_session('W2V') is session
+    False
+    >>> client.sessions = {(service, -1): s for (service, pid), s in
+    ...                    client.sessions.items()}
+    >>> client.get_session('SOLR') is session
+    False
+    >>> client.get_session('SOLR') is client.get_session('SOLR')
+    True
+    '''
+
+
+def cache_is_working():
+    '''
+    >>> import tempfile
+    >>> solr_cache = cache.Cache(os.path.join(tempfile.mkdtemp(), 'solr.db'),
+    ...     size=2)
+    >>> solr_cache.get(['pref_label:"churchill"', 25, 0]) is None
+    True
+    >>> solr_cache.set(['pref_label:"churchill"', 25, 0], [{'id': 'C'}])
+    >>> solr_cache.get(['pref_label:"churchill"', 25, 0])
+    [{u'id': u'C'}]
+    >>> solr_cache.set(['pref_label:"londen"', 25, 0], [])
+    >>> solr_cache.set(['pref_label:"parijs"', 25, 0], [])
+    >>> solr_cache.get(['pref_label:"churchill"', 25, 0]) is None
+    True
+    >>> solr_cache.stats()['entries']
+    2
+    '''
+
+
+def cache_errors_are_ignored():
+    '''
+    >>> import tempfile
+    >>> solr_cache = cache.Cache(os.path.join(tempfile.mkdtemp(), 'missing',
+    ...     'solr.db'))
+    >>> solr_cache.set(['pref_label:"churchill"', 25, 0], [{'id': 'C'}])
+    >>> solr_cache.get(['pref_label:"churchill"', 25, 0]) is None
+    True
+    >>> solr_cache.misses
+    1
+    '''
+
+
+def lru_cache_is_working():
+    '''
+    >>> w2v_cache = cache.LRUCache(2)
+    >>> w2v_cache.set('churchill', [0.1, 0.2])
+    >>> w2v_cache.set('londen', [0.3, 0.4])
+    >>> w2v_cache.get('churchill')
+    [0.1, 0.2]
+    >>> w2v_cache.set('parijs', [])
+    >>> w2v_cache.get('londen') is None
+    True
+    >>> len(w2v_cache)
+    2
+    '''
+
+
+def document_vectors_are_bounded():
+    '''
+    >>> import vectors
+    >>> doc_vectors = vectors.DocumentVectors(size=1000)
+    >>> doc = {'id': 'C', 'abstract_vector': ['[0.1, 0.2]'] * 100}
+    >>> doc_vectors.get_vectors(doc, 'abstract_vector').nbytes
+    800
+    >>> doc_vectors.get_vectors(dict(doc, id='L'), 'abstract_vector').shape
+    (100, 2)
+    >>> len(doc_vectors.memory_cache)
+    1
+    >>> doc_vectors.memory_cache.total
+    800
+    '''
+
+
+class FakeW2VResponse(object):
+    '''
+    Word2vec service response with vectors for known words only.
+    '''
+    status_code = 200
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def json(self):
+        return {'vectors': self.vectors}
+
+
+class FakeW2VClient(object):
+    '''
+    Word2vec service client recording the words requested.
+    '''
+    known = {'churchill': [0.1, 0.2], 'londen': [0.3, 0.4]}
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, service, url, params=None):
+        words = params['source'].split()
+        self.requests.append(words)
+        return FakeW2VResponse([self.known[w] for w in words
+                                if w in self.known])
+
+
+def local_vectors_are_working():
+    '''
+    >>> import tempfile
+    >>> import vectors
+    >>> path = os.path.join(tempfile.mkdtemp(), 'model')
+    >>> with open(path + '.txt', 'w') as f:
+    ...     f.write('5 2\\nlonden 0.3 0.4\\nchurchill 0.1 0.2\\n'
+    ...             'parijs 0.5 0.6\\nlonden 0.7 0.8\\nde 0.9 1.0\\n')
+    >>> vectors.convert(path + '.txt', path, chunk_size=2)
+    >>> sorted(os.listdir(os.path.dirname(path)))
+    ['model.txt', 'model.vectors.npy', 'model.vocab.npy']
+    >>> w2v = vectors.LocalVectors(path)
+    >>> [[round(v, 2) for v in vector] for vector in
+    ...  w2v.get_vectors(['churchill', 'sprak', 'londen', 'de'])]
+    [[0.1, 0.2], [0.3, 0.4], [0.9, 1.0]]
+    '''
+
+
+def remote_vectors_are_cached():
+    '''
+    >>> import vectors
+    >>> client = FakeW2VClient()
+    >>> w2v = vectors.RemoteVectors('http://w2v', client)
+    >>> w2v.get_vectors(['churchill', 'sprak', 'londen', 'sprak'])
+    [[0.1, 0.2], [0.3, 0.4]]
+    >>> client.requests
+    [['churchill', 'sprak', 'londen'], ['churchill'], ['sprak', 'londen'], \
+['sprak'], ['londen']]
+    >>> w2v.memory_cache.get('sprak')
+    []
+    >>> w2v.get_vectors(['londen', 'sprak', 'churchill'])
+    [[0.3, 0.4], [0.1, 0.2]]
+    >>> len(client.requests)
+    5
+    '''
+
+
+def remote_vectors_are_requested_concurrently():
+    '''
+    >>> import vectors
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> executor = ThreadPoolExecutor(max_workers=4)
+    >>> client = FakeW2VClient()
+    >>> w2v = vectors.RemoteVectors('http://w2v', client,
+    ...     get_executor=lambda: executor)
+    >>> words = ['de', 'churchill', 'xqz', 'en', 'londen', 'vnd', 'mr', 'la']
+    >>> w2v.get_vectors(words)
+    [[0.1, 0.2], [0.3, 0.4]]
+    >>> [w2v.memory_cache.get(w) for w in words]
+    [[], [0.1, 0.2], [], [], [0.3, 0.4], [], [], []]
+    >>> len(client.requests)
+    11
+    >>> w2v.get_vectors(['la', 'londen']), len(client.requests)
+    ([[0.3, 0.4]], 11)
+    >>> executor.shutdown()
+    '''
+
+
+def batch_checkpoint_is_working():
+    '''
+    >>> import tempfile
+    >>> batch.get_url('ddd:010734861:mpeg21:a0002') == TEST_DOC
+    True
+    >>> batch.get_url(TEST_DOC) == TEST_DOC
+    True
+    >>> batch.get_url('# comment') is None
+    True
+    >>> path = os.path.join(tempfile.mkdtemp(), 'results.jsonl')
+    >>> lines = [json.dumps({'url': 'a', 'result': {'status': 'ok'}}),
+    ...          json.dumps({'url': 'b', 'result': {'status': 'error'}})]
+    >>> with open(path, 'w') as f:
+    ...     f.write('\\n'.join(lines) + '\\n{"url": "c", "res')
+    >>> sorted(batch.read_checkpoint(path))
+    [u'a', u'b']
+    >>> open(path).read() == '\\n'.join(lines) + '\\n'
+    True
+    >>> done = batch.read_checkpoint(path, retry=True)
+    >>> [url for url in ['a', 'b', 'c'] if url not in done]
+    ['b', 'c']
+    '''
+
+
+def remote_config_is_working():
+    '''
+    >>> import tempfile
+    >>> parse_config = config.parse_config
+    >>> remote = {'SOLR_URL': 'http://solr/'}
+    >>> config.parse_config = lambda url, timeout: dict(remote)
+    >>> path = os.path.join(tempfile.mkdtemp(), 'config.cache.json')
+    >>> conf = config.Config('http://config/', cache_path=path, interval=0)
+    >>> conf.thread.join()
+    >>> conf.get('SOLR_URL')
+    'http://solr/'
+    >>> conf.get('SOLR_MODE') == json.load(open(CONFIG_FILE))['SOLR_MODE']
+    True
+    >>> changes = []
+    >>> conf.add_listener(lambda c: changes.append(c.get('SOLR_URL')))
+    >>> remote['SOLR_URL'] = 'http://solr2/'
+    >>> conf.refresh()
+    True
+    >>> conf.refresh()
+    True
+    >>> changes
+    ['http://solr2/']
+    >>> json.load(open(path))
+    {u'SOLR_URL': u'http://solr2/'}
+    >>> conf.pid = -1
+    >>> conf.get('SOLR_URL')
+    'http://solr2/'
+    >>> conf.pid == os.getpid()
+    True
+    >>> conf.thread.join()
+    >>> config.parse_config = lambda url, timeout: False
+    >>> conf = config.Config('http://config/', cache_path=path, interval=0)
+    >>> conf.thread.join()
+    >>> conf.get('SOLR_URL')
+    u'http://solr2/'
+    >>> conf.get('SOLR_MODE') == json.load(open(CONFIG_FILE))['SOLR_MODE']
+    True
+    >>> config.parse_config = parse_config
+    '''
+
+
+def dictionary_lookups_are_working():
+    '''
+    >>> dictionary.find_role('ministers')
+    'politics_person'
+    >>> dictionary.find_role('oud-minister')
+    'politics_person'
+    >>> dictionary.find_role('londen') is None
+    True
+    >>> dictionary.find_type('hoofdstad')
+    'location'
+    >>> sorted(dictionary.roles_by_dbo['Politician'])
+    ['politics_person']
+    '''
+
+
+def name_analysis_is_working():
+    '''
+    >>> names.get_last_part('willem drees sr')
+    'drees'
+    >>> names.get_last_part('jacob van ruysdael')
+    'van ruysdael'
+    >>> names.get_last_part('jan jan', True)
+    'jan'
+    >>> names.get_substitutions('visscher')
+    ('visser',)
+    >>> names.normalize_ocr('churchill')
+    'ghurehiii'
+    '''
+
+
+def token_index_is_working():
+    '''
+    >>> index = utilities.TokenIndex(u'Minister Drees sprak in Londen. '
+    ...     u'Churchill was er ook.')
+    >>> ' '.join(index.tokens)
+    u'minister drees sprak in londen churchil was er ook'
+    >>> index.window(u'sprak in Londen. Churchill')
+    [u'sprak', u'in', u'londen', u'churchil']
+    >>> index.window(u'in Lon')
+    [u'in', u'lon']
+    >>> index.window(u'Parijs')
+    [u'parijs']
+    '''
+
+
+def token_index_windows_match_tokenize():
+    '''
+    >>> text = (u'Drees sprak in Londen. Daarna sprak Drees in Parijs met '
+    ...         u'J. Jansen. Drees sprak in Londen met Churchill.')
+    >>> index = utilities.TokenIndex(text)
+    >>> s = u'Drees sprak in Londen met Churchill'
+    >>> text.find(s) > text.find(u'Drees sprak in Londen')
+    True
+    >>> index.window(s) == utilities.tokenize(s, segment=False)
+    True
+    >>> s = u'Drees sprak in Londen'
+    >>> index.window(s) == utilities.tokenize(s, segment=False)
+    True
+    >>> s = u'met J. Jansen'
+    >>> index.window(s)
+    [u'met', u'jansen']
+    >>> utilities.tokenize(s, segment=False)
+    [u'met', u'j', u'jansen']
+    '''
+
+
 def dac_nn_model_file_exists():
     '''
     >>> os.path.isfile(NN_MODEL_FILE)
@@ -170,6 +500,425 @@ def dac_nn_feature_file_exists():
     '''
 
 
+def dac_nn_numpy_model_is_working():
+    '''
+    >>> model = inference.NumpyModel(NN_NUMPY_MODEL_FILE)
+    >>> [layer.name for layer in model.layers]
+    [u'dense_1', u'dropout_1', u'dense_2']
+    >>> model.predict(np.zeros((2, 64))).shape
+    (2, 1)
+    '''
+
+
+def dac_svm_numpy_model_is_working():
+    '''
+    >>> model = dac.models.LinearSVM()
+    >>> model.model is None
+    True
+    >>> model.coef.shape
+    (50,)
+    >>> model.predict_batch(np.zeros((2, 50))).shape
+    (2,)
+    '''
+
+
+def count_bound_violations(model, number=200, seed=0):
+    '''
+    Count the predictions above the upper bound of the model, for random
+    examples with random values of the deferred features within their
+    ranges, including the ends of the ranges.
+    '''
+    plan = dac.FeaturePlan(model.features)
+    columns = plan.deferred_columns
+    lows = plan.deferred_lows
+    highs = plan.deferred_highs
+
+    rand = np.random.RandomState(seed)
+    examples = rand.uniform(0, 1, (number, len(model.features)))
+    bounds = model.upper_bounds(examples, columns, lows, highs)
+
+    violations = 0
+    for i in range(10):
+        values = rand.uniform(lows, highs, (number, len(columns)))
+        if i % 2:
+            values = np.where(rand.randint(2, size=values.shape), highs, lows)
+        examples[:, columns] = values
+        violations += int((model.predict_batch(examples) >
+                           bounds + 1e-6).sum())
+    return violations
+
+
+def dac_upper_bounds_are_sound():
+    '''
+    >>> model = dac.models.LinearSVM()
+    >>> len(dac.FeaturePlan(model.features).deferred_columns) > 0
+    True
+    >>> count_bound_violations(model)
+    0
+    >>> model = dac.models.NeuralNet()
+    >>> len(dac.FeaturePlan(model.features).deferred_columns) > 0
+    True
+    >>> count_bound_violations(model)
+    0
+    '''
+
+
+def dac_nn_dense_layers_are_cached():
+    '''
+    >>> model = dac.models.NeuralNet()
+    >>> get_dense_layers = model.get_dense_layers
+    >>> calls = []
+    >>> model.get_dense_layers = lambda: calls.append(1) or get_dense_layers()
+    >>> for i in range(3):
+    ...     bounds = model.upper_bounds(np.zeros((2, 64)), [0], [0.0], [1.0])
+    >>> len(calls)
+    1
+    >>> bounds.shape
+    (2,)
+    '''
+
+
+class TensorFlowModel(object):
+    '''
+    Model that can't be used after a fork.
+    '''
+    def is_fork_safe(self):
+        return False
+
+
+def dac_model_registry_is_working():
+    '''
+    >>> registry = dac.models.ModelRegistry(['svm', 'unknown'], default='nn')
+    >>> registry.names
+    ['svm']
+    >>> registry.default
+    'svm'
+    >>> registry.get() is registry.get('svm')
+    True
+    >>> registry.get('nn')
+    Traceback (most recent call last):
+    ...
+    KeyError: 'Unknown model: nn'
+    >>> registry.models['tf'] = TensorFlowModel()
+    >>> registry.pid = -1
+    >>> svm = registry.get('svm')
+    >>> sorted(registry.models)
+    ['svm']
+    >>> registry.get('svm') is svm
+    True
+    >>> registry.pid == os.getpid()
+    True
+    '''
+
+
+class StubModel(object):
+    '''
+    Model scoring each example by the sum of its feature values.
+    '''
+    features = ['match_str_lsr', 'candidate_inlinks']
+
+    def predict_batch(self, examples):
+        return np.asarray(examples, dtype=float).sum(axis=1) / 10
+
+
+class StubCandidateList(object):
+    '''
+    Candidate list with a fixed feature matrix.
+    '''
+    def __init__(self, examples):
+        self.examples = np.array(examples, dtype=float)
+        self.probs = None
+        self.staged = False
+
+    def get_examples(self):
+        return self.examples
+
+    def set_probs(self, probs=None):
+        self.probs = probs
+
+    def rank_staged(self):
+        self.staged = True
+        self.probs = StubModel().predict_batch(self.examples)
+
+
+class StubCluster(object):
+    '''
+    Cluster taking the candidate probabilities as its result.
+    '''
+    def __init__(self, examples):
+        self.cand_list = StubCandidateList(examples)
+        self.result = None
+
+    def prepare(self, model):
+        return len(self.cand_list.examples) > 0
+
+    def resolve(self):
+        self.result = [float(p) for p in self.cand_list.probs]
+
+
+def link_stub_clusters(batch):
+    '''
+    Link clusters with different numbers of candidates, all at once in
+    batch mode, otherwise one by one.
+    '''
+    linker = dac.EntityLinker(model=StubModel(), batch=batch)
+    clusters = [StubCluster([[1, 2], [3, 4], [5, 6]]), StubCluster([]),
+                StubCluster([[7, 8]]), StubCluster([[0, 1], [1, 0]])]
+    if batch:
+        linker.link_clusters(clusters)
+    else:
+        for cluster in clusters:
+            linker.link_clusters([cluster])
+    return [c.result for c in clusters]
+
+
+def dac_batch_ranking_is_working():
+    '''
+    >>> link_stub_clusters(batch=True)
+    [[0.3, 0.7, 1.1], None, [1.5], [0.1, 0.1]]
+    >>> link_stub_clusters(batch=True) == link_stub_clusters(batch=False)
+    True
+    '''
+
+
+class FakeSolrResponse(object):
+    '''
+    Solr response with the given data.
+    '''
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSolrClient(object):
+    '''
+    Solr client returning fixed results for each query, for single queries
+    as well as grouped requests.
+    '''
+    def __init__(self, results):
+        self.results = results
+        self.requests = []
+
+    def get(self, service, url, params=None):
+        self.requests.append(params)
+        if params.get('group') != 'true':
+            docs = [dict(d) for d in self.results[params['q']]]
+            return FakeSolrResponse(
+                {'response': {'docs': docs[:params['rows']]}})
+
+        queries = params['group.query']
+        grouped = {}
+        for query in queries:
+            docs = []
+            for d in self.results[query][:params['group.limit']]:
+                d = dict(d)
+                # Grouped requests return the score of each separate query
+                # as a pseudo-field, and no regular score
+                for i, q in enumerate(queries):
+                    scores = [r['score'] for r in self.results[q] if
+                              r['id'] == d['id']]
+                    d['solr_score_{}'.format(i)] = (scores[0] if scores
+                                                    else -1)
+                del d['score']
+                docs.append(d)
+            grouped[query] = {'doclist': {'docs': docs}}
+        return FakeSolrResponse({'grouped': grouped})
+
+
+def get_fake_solr_results():
+    '''
+    Get results for four queries, with overlapping results for the first
+    two and more results than SOLR_ROWS in total.
+    '''
+    def doc(i, score):
+        return {'id': 'd{}'.format(i), 'pref_label': 'label {}'.format(i),
+                'score': score}
+
+    return {
+        'q0': [doc(i, 10.0 - i / 10.0) for i in range(20)],
+        'q1': [doc(i, 5.0 - i / 10.0) for i in range(18, 30)],
+        'q2': [doc(i, 2.0) for i in range(30, 35)],
+        'q3': [doc(35, 1.0)]
+    }
+
+
+def query_fake_solr(mode):
+    '''
+    Get the candidates for the fake Solr results in the given Solr mode,
+    and the fake client used.
+    '''
+    solr_client, solr_mode = dac.client, dac.SOLR_MODE
+    dac.client = FakeSolrClient(get_fake_solr_results())
+    dac.SOLR_MODE = mode
+    try:
+        cand_list = dac.CandidateList.__new__(dac.CandidateList)
+        cand_list.cluster = None
+        cand_list.model = dac.models.BaseModel()
+        cand_list.plan = dac.get_feature_plan(cand_list.model.features)
+        candidates = cand_list.query_solr(['q0', 'q1', 'q2', 'q3'], 1)
+        return [(c.document, c.query_id, c.iteration) for c in
+                candidates], dac.client
+    finally:
+        dac.client, dac.SOLR_MODE = solr_client, solr_mode
+
+
+def dac_concurrent_solr_mode_is_working():
+    '''
+    >>> sequential, client = query_fake_solr('sequential')
+    >>> len(sequential), len(client.requests)
+    (25, 3)
+    >>> [r[1] for r in sequential].count(2)
+    2
+    >>> concurrent, client = query_fake_solr('concurrent')
+    >>> concurrent == sequential
+    True
+    '''
+
+
+def dac_combined_solr_mode_is_working():
+    '''
+    >>> sequential, client = query_fake_solr('sequential')
+    >>> combined, client = query_fake_solr('combined')
+    >>> combined == sequential
+    True
+    >>> len(client.requests)
+    1
+    >>> [(d['id'], d['score'], query_id) for d, query_id, iteration in
+    ...  combined if d['id'] in ['d18', 'd20']]
+    [('d18', 8.2, 0), ('d20', 3.0, 1)]
+    >>> [k for k in combined[0][0] if k.startswith('solr_score')]
+    []
+    '''
+
+
+def dac_async_staged_ranking_is_working():
+    '''
+    >>> linker = dac.AsyncEntityLinker(model=StubModel(), staged=True)
+    >>> clusters = [StubCluster([[1, 2], [3, 4]]), StubCluster([])]
+    >>> linker.link_clusters(clusters)
+    >>> [c.result for c in clusters]
+    [[0.3, 0.7], None]
+    >>> [c.cand_list.staged for c in clusters]
+    [True, False]
+    '''
+
+
+class StubContext(dac.Context):
+    '''
+    Context with services failing for the parts listed in failing.
+    '''
+    failing = []
+
+    def check(self, part):
+        if part in self.failing:
+            raise ValueError('{} unavailable'.format(part))
+
+    def get_metadata(self):
+        self.check('metadata')
+        self.article_type = 'artikel'
+
+    def get_entities(self):
+        self.check('entities')
+        self.entities = []
+
+    def retrieve_topics(self):
+        self.check('topics')
+        return {}
+
+
+class StubContextLinker(dac.EntityLinker):
+    '''
+    Linker using the stub context.
+    '''
+    def get_context(self, url, ne=None):
+        return StubContext(url, ne, self.prefetch_topics)
+
+
+def dac_context_errors_are_raised():
+    '''
+    >>> StubContext.failing = ['metadata']
+    >>> StubContext(TEST_DOC)
+    Traceback (most recent call last):
+    ...
+    ValueError: metadata unavailable
+    >>> StubContext.failing = ['entities']
+    >>> StubContext(TEST_DOC)
+    Traceback (most recent call last):
+    ...
+    ValueError: entities unavailable
+    >>> StubContext.failing = ['topics']
+    >>> context = StubContext(TEST_DOC, prefetch_topics=True)
+    >>> context.get_topics()
+    Traceback (most recent call last):
+    ...
+    ValueError: topics unavailable
+    >>> StubContext.failing = ['metadata']
+    >>> linker = StubContextLinker(model=StubModel())
+    >>> linker.link(TEST_DOC)['message']
+    'Error retrieving context: metadata unavailable'
+    >>> StubContext.failing = []
+    >>> linker.link(TEST_DOC) == {'status': 'ok', 'linkedNEs': []}
+    True
+    '''
+
+
+class StubManyLinker(dac.EntityLinker):
+    '''
+    Linker taking the delay in seconds from the url and failing for urls
+    starting with 'fail', keeping track of the number of articles linked at
+    the same time.
+    '''
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def link(self, url, ne=None):
+        with self.lock:
+            StubManyLinker.active += 1
+            StubManyLinker.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(float(url.split(':')[1]))
+            if url.startswith('fail'):
+                raise ValueError('{} unavailable'.format(url))
+            return {'status': 'ok', 'linkedNEs': []}
+        finally:
+            with self.lock:
+                StubManyLinker.active -= 1
+
+
+def dac_link_many_is_working():
+    '''
+    >>> linker = StubManyLinker(model=StubModel())
+    >>> urls = ['a:0.3', 'b:0.05', 'fail:0.05', 'c:0.05', 'd:0.05']
+    >>> results = list(linker.link_many(urls, workers=2))
+    >>> sorted(url for url, result in results) == sorted(urls)
+    True
+    >>> results[-1][0]
+    'a:0.3'
+    >>> [r['status'] for url, r in sorted(results)]
+    ['ok', 'ok', 'ok', 'ok', 'error']
+    >>> dict(results)['fail:0.05']['message']
+    'Error linking article: fail:0.05 unavailable'
+    >>> StubManyLinker.max_active
+    2
+    >>> StubManyLinker.max_active = 0
+    >>> results = list(linker.link_many(urls, workers=1))
+    >>> [url for url, result in results] == urls
+    True
+    >>> StubManyLinker.max_active
+    1
+    >>> linker.error_handling = False
+    >>> list(linker.link_many(['fail:0'], workers=1))
+    Traceback (most recent call last):
+    ...
+    ValueError: fail:0 unavailable
+    '''
+
+
 def dac_nn_local_test():
     '''
     >>> linker = dac.EntityLinker(model='nn')